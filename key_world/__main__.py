@@ -1,23 +1,42 @@
 from key_world.game import Game
-from key_world.replay import Replay
-from key_world.world import all_worlds
+from key_world.batch import GameBatch
+from key_world.replay import ReplayTree
+from key_world.algs_watcher import SearchProcessPool
+from key_world.world import (
+    World,
+    all_worlds,
+    save_world_suite,
+    load_world_suite,
+    load_world_hashes,
+)
 from key_world.analysis import analyze_data
+from key_world.generator import generate_world_suite
+from key_world.beliefs import pack_beliefs, save_beliefs
+from key_world.manifest import make_manifest, update_manifest, mark_done, is_done
+from key_world.work_queue import WorkQueue, work, get_worker_id
 import argparse
+import typing
+import json
 import pathlib
 import numpy as np
+import pandas as pd  # type: ignore[import-untyped]
 import os
+import zlib
 from tqdm import tqdm  # type: ignore[import-untyped]
 import gc
-from itertools import product
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product, groupby
 import logging
 from joblib import Parallel, delayed, parallel_backend  # type: ignore[import-untyped]
 
 
 def hyperparam_search(num_alphas, num_n_turns, num_p_actions, num_p_goals):
-    alphas = np.logspace(0, 5, num=num_alphas, base=4)
-    n_turns = np.arange(1, num_n_turns + 1)
-    p_actions = np.linspace(0.01, 0.65, num=num_p_actions)
-    p_goals = np.linspace(0.01, 0.65, num=num_p_goals)
+    # plain numbers, so file names come out the same in any numpy version
+    # and for tasks that went through a WorkQueue
+    alphas = np.logspace(0, 5, num=num_alphas, base=4).tolist()
+    n_turns = np.arange(1, num_n_turns + 1).tolist()
+    p_actions = np.linspace(0.01, 0.65, num=num_p_actions).tolist()
+    p_goals = np.linspace(0.01, 0.65, num=num_p_goals).tolist()
     logging.info(f"Testing alphas in {list(alphas)}")
     logging.info(f"Testing n_turns in {n_turns}")
     logging.info(f"Testing p_actions in {p_actions}")
@@ -31,65 +50,177 @@ def hyperparam_search(num_alphas, num_n_turns, num_p_actions, num_p_goals):
             yield alpha, ("goal", p)
 
 
-def run_generator(num_alphas, num_n_turns, num_p_actions, num_p_goals):
-    logging.info(f"Starting a run sweep over {len(all_worlds)} worlds")
+def sample_hyperparams(rng, num_candidates, num_n_turns):
+    # continuous alphas and thresholds over the ranges of hyperparam_search,
+    # rounded so they stay readable in file names
+    kinds = ["turn", "action", "goal"]
+    for _ in range(num_candidates):
+        alpha = round(float(4 ** rng.uniform(0, 5)), 3)
+        kind = kinds[int(rng.integers(0, len(kinds)))]
+        if kind == "turn":
+            value = int(rng.integers(1, num_n_turns + 1))
+        else:
+            value = round(float(rng.uniform(0.01, 0.65)), 4)
+        yield alpha, (kind, value)
+
+
+def run_generator(worlds, num_alphas, num_n_turns, num_p_actions, num_p_goals):
+    logging.info(f"Starting a run sweep over {len(worlds)} worlds")
     for (idx, world), hyperparams in tqdm(
         product(
-            enumerate(all_worlds),
+            enumerate(worlds),
             hyperparam_search(num_alphas, num_n_turns, num_p_actions, num_p_goals),
         ),
-        total=(
-            len(all_worlds) * num_alphas * (num_n_turns + num_p_actions + num_p_goals)
-        ),
+        total=(len(worlds) * num_alphas * (num_n_turns + num_p_actions + num_p_goals)),
     ):
         yield hyperparams, (idx, world)
 
 
-def replay_generator(folder, num_alphas, num_n_turns, num_p_actions, num_p_goals):
-    files = list(folder.iterdir())
+def replay_generator(
+    folder, worlds, num_alphas, num_n_turns, num_p_actions, num_p_goals
+):
+    files = sorted(folder.glob("*.csv"))
     logging.info(f"Starting a replay sweep over {len(files)} recordings")
-    for hyperparams, human_csv in tqdm(
-        product(
+    # all update criteria for an alpha are replayed together, see ReplayTree
+    by_alpha = [
+        (alpha, [update_criteria for _, update_criteria in settings])
+        for alpha, settings in groupby(
             hyperparam_search(num_alphas, num_n_turns, num_p_actions, num_p_goals),
-            files,
-        ),
-        total=(len(files) * num_alphas * (num_n_turns + num_p_actions + num_p_goals)),
+            key=lambda hyperparams: hyperparams[0],
+        )
+    ]
+    for hyperparams, human_csv in tqdm(
+        product(by_alpha, files), total=(len(files) * num_alphas)
     ):
         idx = int(human_csv.stem.split("_")[1])
-        world = all_worlds[idx]
+        world = worlds[idx]
         yield hyperparams, (world, human_csv)
 
 
 def get_settings(
-    mode, folder=None, num_alphas=6, num_n_turns=5, num_p_actions=5, num_p_goals=5
+    mode,
+    worlds,
+    folder=None,
+    num_alphas=6,
+    num_n_turns=5,
+    num_p_actions=5,
+    num_p_goals=5,
 ):
     assert mode == "run" or mode == "replay"
     if mode == "replay":
         assert folder is not None
         return replay_generator(
-            folder, num_alphas, num_n_turns, num_p_actions, num_p_goals
+            folder, worlds, num_alphas, num_n_turns, num_p_actions, num_p_goals
         )
     else:
-        return run_generator(num_alphas, num_n_turns, num_p_actions, num_p_goals)
+        return run_generator(
+            worlds, num_alphas, num_n_turns, num_p_actions, num_p_goals
+        )
+
+
+def parse_update_criteria(update_criteria):
+    # "turn:2", "action:0.33" or "goal:0.17", as used in replay file names
+    kind, value = update_criteria.split(":")
+    assert kind in ["turn", "action", "goal"], f"Unknown update criteria {kind}"
+    return (kind, int(value) if kind == "turn" else float(value))
+
+
+def get_worlds(args):
+    if args.world_suite_file is None:
+        return all_worlds
+    worlds = load_world_suite(pathlib.Path(args.world_suite_file))
+    logging.info(f"Loaded {len(worlds)} worlds from {args.world_suite_file}")
+    return worlds
+
+
+def check_worlds(folder, worlds, output=True):
+    # file names only carry world indices, so each folder keeps the suite it
+    # was made with and refuses to mix in results from different worlds; only
+    # output folders get one written, and input folders without one were made
+    # before suites were recorded, on the built-in worlds
+    suite_file = folder / "worlds.json"
+    hashes = [world.content_hash() for world in worlds]
+    if suite_file.exists():
+        assert (
+            load_world_hashes(suite_file) == hashes
+        ), f"{folder} holds results for a different set of worlds"
+    elif output:
+        save_world_suite(worlds, suite_file)
+    else:
+        assert hashes == [
+            world.content_hash() for world in all_worlds
+        ], f"{folder} holds results for the built-in worlds"
+
+
+def get_sweep(args, mode, worlds):
+    # everything that determines a sweep's outputs, see update_manifest
+    sweep_settings = dict(
+        num_alphas=args.num_alphas,
+        num_n_turns=args.num_n_turns,
+        num_p_actions=args.num_p_actions,
+        num_p_goals=args.num_p_goals,
+    )
+    hyperparams = list(hyperparam_search(**sweep_settings))
+    manifest = make_manifest(
+        mode,
+        worlds,
+        hyperparams,
+        args.seed,
+        belief_epsilon=args.belief_epsilon,
+        distance_prior=args.distance_prior,
+        planning_depth=args.planning_depth,
+        planning_budget=args.planning_budget,
+        search_budget=args.search_budget,
+        search_budget_unit=args.search_budget_unit,
+        num_particles=args.num_particles,
+        resample_threshold=args.resample_threshold,
+        **sweep_settings,
+    )
+    return sweep_settings, manifest
+
+
+def get_search_executor(args):
+    # per-turn parallelism for a single game; sweeps with it play their games one
+    # at a time, and parallelize over games without it
+    if args.search_workers <= 0:
+        return None
+    if args.search_executor == "process":
+        return SearchProcessPool(args.search_workers)
+    return ThreadPoolExecutor(max_workers=args.search_workers)
 
 
 def record_game(args):
     assert args.subj is not None, "Must provide a unique subject identifier"
     folder = pathlib.Path(args.record_game_folder)
     folder.mkdir(parents=True, exist_ok=True)
+    worlds = get_worlds(args)
+    # a new recording folder is this subject's output, an existing one is
+    # someone else's data
+    check_worlds(folder, worlds, output=not any(folder.glob("*.csv")))
     played_worlds = [
         int(f.stem.split("_")[1])
-        for f in folder.iterdir()
+        for f in folder.glob("*.csv")
         if f.stem.startswith(args.subj)
     ]
     assert len(played_worlds) == len(
         set(played_worlds)
     ), "Uh oh, there is a duplicate world!"
     logging.info(f"Subject: {args.subj}, Worlds explored: {len(played_worlds)}")
-    assert len(played_worlds) < len(all_worlds), "You have already played all worlds!"
-    remaining_world_idxs = list(set(range(len(all_worlds))) - set(played_worlds))
-    world_idx = np.random.choice(remaining_world_idxs)
-    world = all_worlds[world_idx]
+    assert len(played_worlds) < len(worlds), "You have already played all worlds!"
+    remaining_world_idxs = sorted(set(range(len(worlds))) - set(played_worlds))
+    # reproducible per subject and session, but different across subjects
+    seed = [args.seed, zlib.crc32(args.subj.encode()), len(played_worlds)]
+    logging.info(f"Choosing world with seed {seed}")
+    world_idx = np.random.default_rng(seed).choice(remaining_world_idxs)
+    world = worlds[world_idx]
+    executor = get_search_executor(args)
+    # settings scored live against the human's moves, see OnlineReplay
+    online_settings = list(
+        product(
+            args.online_alphas,
+            [parse_update_criteria(u) for u in args.online_update_criteria],
+        )
+    )
     game = Game(
         world=world,
         human_player=True,
@@ -99,32 +230,210 @@ def record_game(args):
         alpha=-1,
         update_criteria=("None", -1),
         gui=True,
+        belief_epsilon=args.belief_epsilon,
+        distance_prior=args.distance_prior,
+        executor=executor,
+        search_budget=args.search_budget,
+        search_budget_unit=args.search_budget_unit,
+        num_particles=args.num_particles,
+        resample_threshold=args.resample_threshold,
+        particle_seed=[args.seed, int(world_idx)],
+        online_settings=online_settings,
     )
     game.play()
+    if executor:
+        executor.shutdown()
+    if online_settings:
+        # same files a later --replay_data sweep would write for these settings
+        output_folder = pathlib.Path(args.replay_data_folder)
+        output_folder.mkdir(parents=True, exist_ok=True)
+        check_worlds(output_folder, worlds)
+        for alpha, update_criteria, data in game.online_replay_data():
+            output_file = (
+                f"{args.subj}_{world_idx}_update={update_criteria}_alpha={alpha}.csv"
+            )
+            data.to_csv(output_folder / output_file, index=False)
+        logging.info(
+            f"Scored {len(online_settings)} settings online into {output_folder}"
+        )
+
+
+def get_run_csv_name(settings):
+    (alpha, update_criteria), (idx, _) = settings
+    return f"update={update_criteria}_alpha={alpha}_{idx}.csv"
+
+
+def play_game(args, folder, sweep_id, settings, executor=None):
+    (alpha, update_criteria), (idx, world) = settings
+    csv_name = get_run_csv_name(settings)
+    if is_done(folder / csv_name, sweep_id):
+        return
+    # games log as they go, so they play in a scratch folder and only
+    # finished games are moved into place, beliefs first; every process has
+    # its own, since a queued game whose lease ran out can be playing in two
+    partial_folder = folder / "partial" / get_worker_id()
+    beliefs_name = csv_name[: -len(".csv")] + ".npz"
+    (partial_folder / csv_name).unlink(missing_ok=True)
+    game = Game(
+        world=world,
+        human_player=False,
+        record=True,
+        output_folder=partial_folder,
+        csv_name=csv_name,
+        alpha=alpha,
+        update_criteria=update_criteria,
+        gui=False,
+        belief_epsilon=args.belief_epsilon,
+        distance_prior=args.distance_prior,
+        planning_depth=args.planning_depth,
+        planning_budget=args.planning_budget,
+        search_budget=args.search_budget,
+        search_budget_unit=args.search_budget_unit,
+        num_particles=args.num_particles,
+        resample_threshold=args.resample_threshold,
+        particle_seed=[args.seed, idx],
+        executor=executor,
+    )
+    game.play()
+    os.replace(partial_folder / beliefs_name, folder / beliefs_name)
+    os.replace(partial_folder / csv_name, folder / csv_name)
+    mark_done(folder / csv_name, sweep_id)
+    del game
+    gc.collect()
+
+
+def play_batch(args, worlds, folder, sweep_id, batch_settings):
+    # the same files as play_game, for batch_size games at a time
+    batch_settings = [
+        settings
+        for settings in batch_settings
+        if not is_done(folder / get_run_csv_name(settings), sweep_id)
+    ]
+    if not batch_settings:
+        return
+    batch = GameBatch(
+        worlds,
+        [
+            (idx, alpha, update_criteria)
+            for (alpha, update_criteria), (idx, _) in batch_settings
+        ],
+        belief_epsilon=args.belief_epsilon,
+        distance_prior=args.distance_prior,
+    )
+    batch.play()
+    partial_folder = folder / "partial" / get_worker_id()
+    partial_folder.mkdir(parents=True, exist_ok=True)
+    for i, settings in enumerate(batch_settings):
+        csv_name = get_run_csv_name(settings)
+        beliefs_name = csv_name[: -len(".csv")] + ".npz"
+        batch.game_log(i).to_csv(partial_folder / csv_name, index=False)
+        save_beliefs(partial_folder / beliefs_name, batch.game_beliefs(i))
+        os.replace(partial_folder / beliefs_name, folder / beliefs_name)
+        os.replace(partial_folder / csv_name, folder / csv_name)
+        mark_done(folder / csv_name, sweep_id)
 
 
 def run_model(args):
     folder = pathlib.Path(args.run_model_folder)
     folder.mkdir(parents=True, exist_ok=True)
-
-    def play_game(settings):
-        (alpha, update_criteria), (idx, world) = settings
-        game = Game(
-            world=world,
-            human_player=False,
-            record=True,
-            output_folder=folder,
-            csv_name=f"update={update_criteria}_alpha={alpha}_{idx}.csv",
-            alpha=alpha,
-            update_criteria=update_criteria,
-            gui=False,
+    worlds = get_worlds(args)
+    check_worlds(folder, worlds)
+    sweep_settings, manifest = get_sweep(args, "run", worlds)
+    sweep_id = update_manifest(folder, manifest)
+    (folder / "partial").mkdir(exist_ok=True)
+    if args.batch_size > 0:
+        # lockstep games, see GameBatch; the sweep goes world by world, so
+        # games in a batch mostly share their world's distance table
+        assert (
+            args.planning_depth == 0
+            and args.search_budget is None
+            and args.num_particles == 0
+        ), "Batches only play the one-step model Watcher"
+    pending = [
+        settings
+        for settings in get_settings("run", worlds, **sweep_settings)
+        if not is_done(folder / get_run_csv_name(settings), sweep_id)
+    ]
+    batch_size = max(1, args.batch_size)
+    chunks = [
+        pending[start : start + batch_size]
+        for start in range(0, len(pending), batch_size)
+    ]
+    if args.queue_folder is not None and chunks:
+        enqueue(
+            args,
+            "run",
+            sweep_id,
+            [
+                [
+                    [float(alpha), [kind, value], idx]
+                    for (alpha, (kind, value)), (idx, _) in chunk
+                ]
+                for chunk in chunks
+            ],
         )
-        game.play()
-        del game
-        gc.collect()
+        return
+    executor = None if args.batch_size > 0 else get_search_executor(args)
+    if executor:
+        for settings in tqdm(pending):
+            play_game(args, folder, sweep_id, settings, executor)
+        executor.shutdown()
+    else:
+        with parallel_backend("loky", n_jobs=-2):
+            if args.batch_size > 0:
+                Parallel()(
+                    delayed(play_batch)(args, worlds, folder, sweep_id, chunk)
+                    for chunk in chunks
+                )
+            else:
+                Parallel()(
+                    delayed(play_game)(args, folder, sweep_id, settings)
+                    for settings in pending
+                )
+    pack_beliefs(folder)
+
 
-    with parallel_backend("loky", n_jobs=-2):
-        Parallel()(delayed(play_game)(settings) for settings in get_settings("run"))
+def get_replay_output_files(output_folder, settings):
+    (alpha, update_criteria_list), (_, human_csv) = settings
+    return [
+        output_folder / f"{human_csv.stem}_update={update_criteria}_alpha={alpha}.csv"
+        for update_criteria in update_criteria_list
+    ]
+
+
+def replay_game(args, output_folder, sweep_id, settings, executor=None):
+    (alpha, update_criteria_list), (world, human_csv) = settings
+    output_files = get_replay_output_files(output_folder, settings)
+    if all(is_done(output_file, sweep_id) for output_file in output_files):
+        return
+    replay = ReplayTree(
+        world=world,
+        human_csv=human_csv,
+        alpha=alpha,
+        update_criteria=update_criteria_list,
+        belief_epsilon=args.belief_epsilon,
+        distance_prior=args.distance_prior,
+        search_budget=args.search_budget,
+        search_budget_unit=args.search_budget_unit,
+        num_particles=args.num_particles,
+        resample_threshold=args.resample_threshold,
+        particle_seed=[args.seed, int(human_csv.stem.split("_")[1])],
+        executor=executor,
+    )
+    replay_data = replay.replay()
+    for update_criteria, output_file in zip(update_criteria_list, output_files):
+        # written under a temporary name of this process so neither an
+        # interrupted sweep nor another worker on the same task leaves
+        # truncated outputs behind
+        partial_file = output_file.with_name(
+            f"{output_file.name}.{get_worker_id()}.partial"
+        )
+        replay_data[update_criteria].to_csv(partial_file, index=False)
+        os.replace(partial_file, output_file)
+        mark_done(output_file, sweep_id)
+    del replay
+    del replay_data
+    gc.collect()
 
 
 def replay_data(args):
@@ -132,27 +441,281 @@ def replay_data(args):
     input_folder = pathlib.Path(args.record_game_folder)
     assert os.path.exists(input_folder)
     output_folder.mkdir(parents=True, exist_ok=True)
+    worlds = get_worlds(args)
+    check_worlds(input_folder, worlds, output=False)
+    check_worlds(output_folder, worlds)
+    sweep_settings, manifest = get_sweep(args, "replay", worlds)
+    sweep_id = update_manifest(output_folder, manifest)
+    pending = [
+        settings
+        for settings in get_settings("replay", worlds, input_folder, **sweep_settings)
+        if not all(
+            is_done(output_file, sweep_id)
+            for output_file in get_replay_output_files(output_folder, settings)
+        )
+    ]
+    if args.queue_folder is not None and pending:
+        enqueue(
+            args,
+            "replay",
+            sweep_id,
+            [
+                [float(alpha), update_criteria_list, str(human_csv.resolve())]
+                for (alpha, update_criteria_list), (_, human_csv) in pending
+            ],
+        )
+        return
+    executor = get_search_executor(args)
+    if executor:
+        for settings in tqdm(pending):
+            replay_game(args, output_folder, sweep_id, settings, executor)
+        executor.shutdown()
+    else:
+        with parallel_backend("loky", n_jobs=-2):
+            Parallel()(
+                delayed(replay_game)(args, output_folder, sweep_id, settings)
+                for settings in pending
+            )
+
+
+# arguments that only say how tasks are queued and run, not what they do
+QUEUE_ARGS = ["queue_folder", "worker", "lease_seconds", "max_attempts"]
+
+
+def enqueue(args, mode, sweep_id, all_settings):
+    # one task per game, batch or replay of the sweep, see WorkQueue; paths
+    # are made absolute, so every machine must see the folders at the same place
+    task_args = {k: v for k, v in vars(args).items() if k not in QUEUE_ARGS}
+    for name in [
+        "record_game_folder",
+        "run_model_folder",
+        "replay_data_folder",
+        "world_suite_file",
+    ]:
+        if task_args[name] is not None:
+            task_args[name] = str(pathlib.Path(task_args[name]).resolve())
+    queue = WorkQueue(
+        pathlib.Path(args.queue_folder), args.lease_seconds, args.max_attempts
+    )
+    added = sum(
+        queue.put(
+            {
+                "mode": mode,
+                "args": task_args,
+                "sweep_id": sweep_id,
+                "settings": settings,
+            }
+        )
+        for settings in all_settings
+    )
+    logging.info(
+        f"Queued {added} of {len(all_settings)} {mode} tasks in {args.queue_folder}; "
+        "start workers with --worker, then run the sweep again to finish it"
+    )
+
+
+# a worker's worlds by suite file and search pools by size, set up once for
+# all its tasks
+worker_worlds: typing.Dict[typing.Optional[str], typing.List[World]] = {}
+worker_executors: typing.Dict[typing.Tuple[str, int], typing.Any] = {}
+
+
+def run_task(task):
+    # a WorkQueue task, as the sweep that queued it would have run it
+    args = argparse.Namespace(**task["args"])
+    if args.world_suite_file not in worker_worlds:
+        worker_worlds[args.world_suite_file] = get_worlds(args)
+    worlds = worker_worlds[args.world_suite_file]
+    pool = (args.search_executor, args.search_workers)
+    if pool not in worker_executors:
+        worker_executors[pool] = get_search_executor(args)
+    executor = worker_executors[pool]
+    if task["mode"] == "run":
+        folder = pathlib.Path(args.run_model_folder)
+        all_settings = [
+            ((alpha, (kind, value)), (idx, worlds[idx]))
+            for alpha, (kind, value), idx in task["settings"]
+        ]
+        if args.batch_size > 0:
+            play_batch(args, worlds, folder, task["sweep_id"], all_settings)
+        else:
+            for settings in all_settings:
+                play_game(args, folder, task["sweep_id"], settings, executor)
+    else:
+        alpha, update_criteria_list, human_csv = task["settings"]
+        human_csv = pathlib.Path(human_csv)
+        world = worlds[int(human_csv.stem.split("_")[1])]
+        replay_game(
+            args,
+            pathlib.Path(args.replay_data_folder),
+            task["sweep_id"],
+            (
+                (alpha, [(kind, value) for kind, value in update_criteria_list]),
+                (world, human_csv),
+            ),
+            executor,
+        )
+
+
+def worker(args):
+    assert args.queue_folder is not None, "Workers need a --queue_folder"
+    queue = WorkQueue(
+        pathlib.Path(args.queue_folder), args.lease_seconds, args.max_attempts
+    )
+    num_tasks = work(queue, run_task)
+    for executor in worker_executors.values():
+        if executor:
+            executor.shutdown()
+    logging.info(
+        f"No tasks left after running {num_tasks}; {queue.count('done')} done "
+        f"and {queue.count('failed')} failed in {args.queue_folder}"
+    )
+
+
+def adaptive_search(args):
+    # Successive halving over sampled settings instead of the full grid: every
+    # candidate is replayed on a few recordings, the better 1 / halving_rate by
+    # average log likelihood go on to halving_rate times as many recordings,
+    # and so on until one is left or all recordings are used. Replays land in
+    # their own folder under the usual names, so an interrupted search resumes.
+    output_folder = pathlib.Path(args.adaptive_search_folder)
+    input_folder = pathlib.Path(args.record_game_folder)
+    assert os.path.exists(input_folder)
+    assert args.halving_rate >= 2
+    output_folder.mkdir(parents=True, exist_ok=True)
+    worlds = get_worlds(args)
+    check_worlds(input_folder, worlds, output=False)
+    check_worlds(output_folder, worlds)
+    rng = np.random.default_rng(args.seed)
+    candidates = list(sample_hyperparams(rng, args.num_candidates, args.num_n_turns))
+    files = list(rng.permutation(sorted(input_folder.glob("*.csv"))))
+    assert files, f"No recordings in {input_folder}"
+    manifest = make_manifest(
+        "adaptive",
+        worlds,
+        candidates,
+        args.seed,
+        belief_epsilon=args.belief_epsilon,
+        distance_prior=args.distance_prior,
+        num_candidates=args.num_candidates,
+        num_n_turns=args.num_n_turns,
+        min_recordings=args.min_recordings,
+        halving_rate=args.halving_rate,
+    )
+    sweep_id = update_manifest(output_folder, manifest)
 
-    def replay_game(settings):
-        (alpha, update_criteria), (world, human_csv) = settings
-        replay = Replay(
-            world=world,
-            human_csv=human_csv,
-            alpha=alpha,
-            update_criteria=update_criteria,
+    def evaluate(settings):
+        (alpha, update_criteria), human_csv = settings
+        output_file = (
+            output_folder
+            / f"{human_csv.stem}_update={update_criteria}_alpha={alpha}.csv"
         )
-        data = replay.replay()
-        output_file = human_csv.stem + f"_update={update_criteria}_alpha={alpha}.csv"
-        data.to_csv(output_folder / output_file, index=False)
-        del replay
-        del data
-        gc.collect()
+        if not is_done(output_file, sweep_id):
+            idx = int(human_csv.stem.split("_")[1])
+            replay = ReplayTree(
+                world=worlds[idx],
+                human_csv=human_csv,
+                alpha=alpha,
+                update_criteria=[update_criteria],
+                belief_epsilon=args.belief_epsilon,
+                distance_prior=args.distance_prior,
+            )
+            partial_file = output_file.with_name(
+                f"{output_file.name}.{get_worker_id()}.partial"
+            )
+            replay.replay()[update_criteria].to_csv(partial_file, index=False)
+            os.replace(partial_file, output_file)
+            mark_done(output_file, sweep_id)
+        return float(pd.read_csv(output_file)["log_likelihood"].mean())
 
-    with parallel_backend("loky", n_jobs=-2):
-        Parallel()(
-            delayed(replay_game)(settings)
-            for settings in get_settings("replay", input_folder)
+    scores = {}
+    survivors = candidates
+    num_recordings = min(max(1, args.min_recordings), len(files))
+    rungs = []
+    while True:
+        recordings = files[:num_recordings]
+        todo = [
+            (candidate, human_csv)
+            for candidate in survivors
+            for human_csv in recordings
+            if (candidate, human_csv) not in scores
+        ]
+        logging.info(
+            f"Replaying {len(survivors)} settings on {num_recordings} recordings"
+        )
+        with parallel_backend("loky", n_jobs=-2):
+            results = Parallel()(delayed(evaluate)(settings) for settings in todo)
+        scores.update(zip(todo, results))
+        ranked = sorted(
+            survivors,
+            key=lambda candidate: -np.mean(
+                [scores[(candidate, f)] for f in recordings]
+            ),
         )
+        rungs.append(
+            {
+                "num_recordings": num_recordings,
+                "replays": len(todo),
+                "settings": [
+                    [
+                        alpha,
+                        kind,
+                        value,
+                        float(
+                            np.mean(
+                                [
+                                    scores[((alpha, (kind, value)), f)]
+                                    for f in recordings
+                                ]
+                            )
+                        ),
+                    ]
+                    for alpha, (kind, value) in ranked
+                ],
+            }
+        )
+        survivors = ranked[: max(1, len(ranked) // args.halving_rate)]
+        if len(survivors) == 1 or num_recordings == len(files):
+            break
+        num_recordings = min(num_recordings * args.halving_rate, len(files))
+
+    alpha, (kind, value) = ranked[0]
+    num_replays = len(scores)
+    full_replays = len(candidates) * len(files)
+    grid_replays = (
+        args.num_alphas
+        * (args.num_n_turns + args.num_p_actions + args.num_p_goals)
+        * len(files)
+    )
+    report = {
+        "best": {"alpha": alpha, "update_criteria": [kind, value]},
+        "replays": num_replays,
+        "replays_all_candidates": full_replays,
+        "replays_grid": grid_replays,
+        "rungs": rungs,
+    }
+    with open(output_folder / "adaptive_search.json", "w") as f:
+        json.dump(report, f, indent=1)
+    logging.info(
+        f"Best setting alpha={alpha}, update={(kind, value)} after {num_replays} "
+        f"replays ({num_replays / full_replays:.0%} of all {len(candidates)} "
+        f"candidates on every recording, {num_replays / grid_replays:.0%} of the "
+        f"grid sweep)"
+    )
+
+
+def generate_worlds(args):
+    assert args.world_suite_file is not None, "Must provide a file to write to"
+    worlds = generate_world_suite(
+        sizes=args.world_sizes,
+        worlds_per_size=args.worlds_per_size,
+        num_key_ids=args.num_key_ids,
+        num_doors=args.num_doors,
+        wall_density=args.wall_density,
+        seed=args.seed,
+    )
+    save_world_suite(worlds, pathlib.Path(args.world_suite_file))
+    logging.info(f"Saved {len(worlds)} worlds to {args.world_suite_file}")
 
 
 if __name__ == "__main__":
@@ -165,9 +728,72 @@ if __name__ == "__main__":
     parser.add_argument("--run_model", action="store_true")
     parser.add_argument("--replay_data", action="store_true")
     parser.add_argument("--analyze_data", action="store_true")
+    parser.add_argument("--adaptive_search", action="store_true")
+    parser.add_argument("--adaptive_search_folder", type=str, default="adaptive_search")
+    parser.add_argument("--num_candidates", type=int, default=32)
+    parser.add_argument("--min_recordings", type=int, default=2)
+    parser.add_argument("--halving_rate", type=int, default=2)
+    parser.add_argument("--streaming_analysis", action="store_true")
+    parser.add_argument("--plot_workers", type=int, default=0)
+    parser.add_argument("--combined_belief_plots", action="store_true")
+    parser.add_argument("--bootstrap_resamples", type=int, default=0)
+    parser.add_argument("--belief_epsilon", type=float, default=0.0)
+    # start beliefs from the Knower's distance to each goal instead of equal
+    parser.add_argument("--distance_prior", action="store_true")
+    parser.add_argument("--planning_depth", type=int, default=0)
+    parser.add_argument("--planning_budget", type=int, default=1000)
+    # per-turn search budget of the model Watcher, see SearchBudget; sweep it
+    # like belief_epsilon, one output folder per budget
+    parser.add_argument("--search_budget", type=float, default=None)
+    parser.add_argument(
+        "--search_budget_unit", choices=["nodes", "ms"], default="nodes"
+    )
+    # approximate beliefs from this many goal samples, see GoalParticles; the
+    # samples are seeded by --seed and the world index
+    parser.add_argument("--num_particles", type=int, default=0)
+    parser.add_argument("--resample_threshold", type=float, default=0.5)
+    parser.add_argument("--num_alphas", type=int, default=6)
+    parser.add_argument("--num_n_turns", type=int, default=5)
+    parser.add_argument("--num_p_actions", type=int, default=5)
+    parser.add_argument("--num_p_goals", type=int, default=5)
+    # play the run sweep this many games at a time in lockstep, see GameBatch
+    parser.add_argument("--batch_size", type=int, default=0)
+    parser.add_argument("--search_workers", type=int, default=0)
+    parser.add_argument(
+        "--search_executor", choices=["thread", "process"], default="process"
+    )
+    parser.add_argument("--online_alphas", type=float, nargs="+", default=[])
+    parser.add_argument("--online_update_criteria", type=str, nargs="+", default=[])
+    # with --run_model or --replay_data, queue the sweep's tasks in this folder
+    # instead of running them, for --worker processes on any machine that
+    # shares it; see WorkQueue
+    parser.add_argument("--queue_folder", type=str, default=None)
+    parser.add_argument("--worker", action="store_true")
+    parser.add_argument("--lease_seconds", type=float, default=600.0)
+    parser.add_argument("--max_attempts", type=int, default=3)
+    parser.add_argument("--generate_worlds", action="store_true")
+    parser.add_argument("--world_suite_file", type=str, default=None)
+    parser.add_argument(
+        "--world_sizes", type=int, nargs="+", default=[10, 25, 50, 100, 200]
+    )
+    parser.add_argument("--worlds_per_size", type=int, default=1)
+    parser.add_argument("--num_key_ids", type=int, default=2)
+    parser.add_argument("--num_doors", type=int, default=0)
+    parser.add_argument("--wall_density", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
     args = parser.parse_args()
     assert (
-        sum([args.record_game, args.run_model, args.replay_data, args.analyze_data])
+        sum(
+            [
+                args.record_game,
+                args.run_model,
+                args.replay_data,
+                args.analyze_data,
+                args.adaptive_search,
+                args.generate_worlds,
+                args.worker,
+            ]
+        )
         == 1
     )
 
@@ -177,9 +803,20 @@ if __name__ == "__main__":
         run_model(args)
     elif args.replay_data:
         replay_data(args)
+    elif args.adaptive_search:
+        adaptive_search(args)
+    elif args.generate_worlds:
+        generate_worlds(args)
+    elif args.worker:
+        worker(args)
     else:
         analyze_data(
             record_game_folder=args.record_game_folder,
             run_model_folder=args.run_model_folder,
             replay_data_folder=args.replay_data_folder,
+            streaming=args.streaming_analysis,
+            plot_workers=args.plot_workers,
+            combined_belief_plots=args.combined_belief_plots,
+            bootstrap_resamples=args.bootstrap_resamples,
+            seed=args.seed,
         )
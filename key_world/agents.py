@@ -1,13 +1,22 @@
 import abc
+import copy
 import typing
 import numpy as np
-from key_world.world import World, Door, Key, Pos, Lookups, MainDoor
+from concurrent.futures import Executor
+from key_world.world import World, Door, Key, Pos, MainDoor
 from key_world.algs_knower import get_moves
 from key_world.algs_watcher import (
     predict_knower_move,
     choose_move_given_beliefs,
     update_beliefs,
     init_beliefs,
+    prune_beliefs,
+    get_p_next_given_goal_from_lengths,
+    KnowerDistances,
+    Planner,
+    SearchBudget,
+    GoalParticles,
+    MOVE_SEARCH_SHARE,
 )
 
 
@@ -32,19 +41,12 @@ class Agent(abc.ABC):
             pos = self.choose_move()
 
         door: typing.Optional[Door] = options[valid_positions.index(pos)][1]
-        if door:
-            # otherwise remove door
-            self.world.remove_door(door)
-
-        self.pos = pos
-        key: typing.Optional[Key] = self.world.lookup(self.pos, Lookups.KEY)  # type: ignore[assignment]
-        if key:
-            self.pickup_key(key)
+        # opens the door, if any, and picks up any key at pos; see World.apply
+        self.world.apply(self, pos, door)
         return self.pos
 
     def putdown_key(self, key):
-        key.pos = self.pos
-        self.world.add_key(key)
+        self.world.add_key(key, self.pos)
         self.key = None
 
     def pickup_key(self, new_key: Key):
@@ -97,12 +99,64 @@ class Watcher(Agent):
         move_list: typing.Optional[typing.List[Pos]] = None,
         alpha: float = 1,
         update_criteria: typing.Tuple[str, float] = ("turn", 1),
+        belief_epsilon: float = 0.0,
+        distance_prior: bool = False,
+        executor: typing.Optional[Executor] = None,
+        planning_depth: int = 0,
+        planning_budget: int = 1000,
+        search_budget: typing.Optional[float] = None,
+        search_budget_unit: str = "nodes",
+        num_particles: int = 0,
+        resample_threshold: float = 0.5,
+        particle_seed: typing.Any = None,
     ) -> None:
         super().__init__(pos, world)
         self.predictions = None
         self.knower = knower
         self.alpha = alpha
-        self.beliefs = init_beliefs(self.world, self.knower, self.alpha)
+        self.belief_epsilon = belief_epsilon
+        # belief mass pruned each turn, zero unless belief_epsilon > 0
+        self.approximation_error: typing.List[float] = []
+        # optional pool for the independent searches within a turn
+        self.executor = executor
+        self.knower_distances = KnowerDistances(self.world, self.executor)
+        # looks planning_depth turns ahead instead of one move, see Planner
+        self.planner = (
+            Planner(self.world, self.alpha, planning_depth, planning_budget)
+            if planning_depth > 0
+            else None
+        )
+        # bounds the searches of every turn after the first beliefs, which
+        # are always exact, see SearchBudget; the planner has its own budget
+        assert search_budget is None or self.planner is None
+        self.search_budget = (
+            SearchBudget(search_budget, search_budget_unit)
+            if search_budget is not None
+            else None
+        )
+        # search nodes expanded and milliseconds spent each turn under the budget
+        self.search_nodes: typing.List[int] = []
+        self.search_ms: typing.List[float] = []
+        self.beliefs = init_beliefs(
+            self.world,
+            self.knower,
+            self.alpha,
+            self.knower_distances,
+            distance_prior,
+        )
+        # approximate beliefs from num_particles goal samples, see GoalParticles
+        self.particles: typing.Optional[GoalParticles] = None
+        if num_particles > 0:
+            self.particles = GoalParticles(
+                self.beliefs,
+                num_particles,
+                np.random.default_rng(particle_seed),
+                resample_threshold,
+            )
+            live_beliefs = self.particles.get_beliefs()
+            self.beliefs = {
+                goal: live_beliefs.get(goal, 0.0) for goal in sorted(self.beliefs)
+            }
         self.mode = mode
         self.move_list = move_list
         self._wait_for_key_press = wait_for_key_press
@@ -117,35 +171,106 @@ class Watcher(Agent):
         if self.mode == "human":
             self.num_moves += 1
             return self.get_user_move()
-        if self.should_update():
-            self.beliefs = update_beliefs(self.knower, self.predictions, self.beliefs)
-        move_dist = choose_move_given_beliefs(
-            self, self.world, self.beliefs, alpha=self.alpha
-        )
+        move_dist, knower_probs = self.deliberate()
         if self.mode == "replay":
             assert self.move_list and self.num_moves < len(self.move_list)
             move = self.move_list[self.num_moves]
-            self.log_likelihood.append(np.log(move_dist[move]))
-            if self.predictions:
-                self.action_prob.append(self.predictions[0][self.knower.pos])
-                self.goal_prob.append(
-                    self.predictions[1][max(self.beliefs, key=self.beliefs.get)][
-                        self.knower.pos
-                    ]
-                )
-            else:
-                self.action_prob.append(np.nan)
-                self.goal_prob.append(np.nan)
+            self.score_move(move, move_dist, knower_probs)
         elif self.mode == "model":
-            move = max(move_dist, key=move_dist.get)
+            move = max(move_dist, key=move_dist.get)  # type: ignore[arg-type]
         else:
             return NotImplemented
-        self.predictions = predict_knower_move(
-            self.world, self.knower, self.beliefs, self.alpha
-        )
         self.num_moves += 1
         return move
 
+    def fork(self) -> "Watcher":
+        # same beliefs and history, but sharing the world, Knower and search caches
+        watcher = copy.copy(self)
+        watcher.approximation_error = list(self.approximation_error)
+        watcher.search_nodes = list(self.search_nodes)
+        watcher.search_ms = list(self.search_ms)
+        watcher.particles = copy.deepcopy(self.particles)
+        if self.mode == "replay":
+            watcher.log_likelihood = list(self.log_likelihood)
+            watcher.action_prob = list(self.action_prob)
+            watcher.goal_prob = list(self.goal_prob)
+        return watcher
+
+    def deliberate(
+        self,
+    ) -> typing.Tuple[typing.Dict[Pos, float], typing.Tuple[float, float]]:
+        # the model's turn up to the choice of move; it only depends on the state
+        # before the Watcher moves, so it can run while a human is still deciding
+        if self.search_budget:
+            self.search_budget.start_turn()
+        if self.should_update():
+            if self.particles:
+                self.particles.update(self.knower, self.predictions[1])  # type: ignore[index]
+                live_beliefs = self.particles.get_beliefs()
+                self.beliefs = {
+                    goal: live_beliefs.get(goal, 0.0) for goal in self.beliefs
+                }
+            else:
+                self.beliefs = update_beliefs(
+                    self.knower, self.predictions, self.beliefs
+                )
+        # goals without particles are left out of the searches, and so are the
+        # goals pruned here
+        beliefs, pruned_mass = prune_beliefs(
+            self.particles.get_beliefs() if self.particles else self.beliefs,
+            self.belief_epsilon,
+        )
+        self.approximation_error.append(pruned_mass)
+        if self.planner:
+            costs, _ = self.planner.plan(self, self.knower, beliefs)
+            move_dist = get_p_next_given_goal_from_lengths(costs, self.alpha)
+        else:
+            if self.search_budget:
+                # the rest of the turn is kept for predicting the Knower
+                self.search_budget.start_phase(MOVE_SEARCH_SHARE)
+            move_dist = choose_move_given_beliefs(
+                self,
+                self.world,
+                beliefs,
+                alpha=self.alpha,
+                executor=self.executor,
+                budget=self.search_budget,
+            )
+        # how likely the last predictions found the Knower's actual move
+        if self.predictions:
+            best_goal = max(self.beliefs, key=self.beliefs.get)  # type: ignore[arg-type]
+            knower_probs = (
+                self.predictions[0][self.knower.pos],
+                self.predictions[1][best_goal][self.knower.pos],
+            )
+        else:
+            knower_probs = (np.nan, np.nan)
+        if self.search_budget:
+            self.search_budget.start_phase(1.0)
+        self.predictions = predict_knower_move(
+            self.world,
+            self.knower,
+            beliefs,
+            self.alpha,
+            self.knower_distances,
+            self.search_budget,
+        )
+        if self.search_budget:
+            self.search_nodes.append(self.search_budget.nodes)
+            self.search_ms.append(self.search_budget.spent_ms())
+        return move_dist, knower_probs
+
+    def score_move(
+        self,
+        move: Pos,
+        move_dist: typing.Dict[Pos, float],
+        knower_probs: typing.Tuple[float, float],
+    ) -> None:
+        assert self.mode == "replay"
+        self.log_likelihood.append(np.log(move_dist[move]))
+        self.action_prob.append(knower_probs[0])
+        self.goal_prob.append(knower_probs[1])
+
     def get_user_move(self) -> Pos:
         assert self.mode == "human"
         x, y = self.pos
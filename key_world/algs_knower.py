@@ -2,7 +2,6 @@ import typing
 from collections import deque
 from key_world.world import World, Key, Door, Pos, Lookups, Orientation
 from pydantic import BaseModel
-import copy
 
 
 class Node(BaseModel):
@@ -57,7 +56,8 @@ def make_get_neighbors(
             key_ids.update([k.identifier for k in world.keys])
         for key_id in key_ids:
             options.update(world.get_accessible_neighbors(node.pos, key_id))
-        return [get_node(node, opt) for opt in options]
+        # in order of position, so searches break ties the same way in every run
+        return [get_node(node, opt) for opt in sorted(options, key=lambda o: o[0])]
 
     return get_neighbors
 
@@ -71,9 +71,10 @@ def make_get_node(
     ) -> Node:
         pos, door = option
         curr_key_id = curr_node.key_id
-        used_key_ids = copy.deepcopy(curr_node.used_key_ids)
-        opened_door_ids = copy.deepcopy(curr_node.opened_door_ids)
-        dropped_keys = copy.deepcopy(curr_node.dropped_keys)
+        # dropped keys are never changed once made, so shallow copies will do
+        used_key_ids = list(curr_node.used_key_ids)
+        opened_door_ids = list(curr_node.opened_door_ids)
+        dropped_keys = dict(curr_node.dropped_keys)
 
         if not key_agnostic:
             assert len(opened_door_ids) == 0
@@ -122,12 +123,33 @@ def make_get_node(
     return get_node
 
 
-def find_path(start: Node, goal: Node, get_neighbors) -> typing.List[Pos]:
+@typing.overload
+def find_path(
+    start: Node,
+    goal: Node,
+    get_neighbors,
+    length_only: typing.Literal[False] = False,
+) -> typing.List[Pos]:
+    ...
+
+
+@typing.overload
+def find_path(
+    start: Node, goal: Node, get_neighbors, length_only: typing.Literal[True]
+) -> int:
+    ...
+
+
+def find_path(
+    start: Node, goal: Node, get_neighbors, length_only: bool = False
+) -> typing.Union[typing.List[Pos], int]:
     queue = deque([start])
     seen = set([start])
     while queue:
         curr_node = queue.popleft()
         if curr_node == goal:
+            if length_only:
+                return get_path_length(curr_node)
             return get_path_to(curr_node)
         for child_node in get_neighbors(curr_node):
             if child_node not in seen:
@@ -136,7 +158,43 @@ def find_path(start: Node, goal: Node, get_neighbors) -> typing.List[Pos]:
     raise RuntimeError("Could not find a path to the goal")
 
 
-def get_path_to(node: Node, pos_seq: typing.List[Pos] = []) -> typing.List[Pos]:
-    if node.parent:
-        return get_path_to(node.parent, [node.pos] + pos_seq)
+def find_path_lengths(
+    start: Node, goals: typing.List[Node], get_neighbors
+) -> typing.List[int]:
+    # one search for several goals that differ only in key id; each goal gets
+    # the length find_path would have returned for it on its own
+    lengths: typing.List[typing.Optional[int]] = [None] * len(goals)
+    num_found = 0
+    queue = deque([start])
+    seen = set([start])
+    while queue:
+        curr_node = queue.popleft()
+        for i, goal in enumerate(goals):
+            if lengths[i] is None and curr_node == goal:
+                lengths[i] = get_path_length(curr_node)
+                num_found += 1
+        if num_found == len(goals):
+            return lengths  # type: ignore[return-value]
+        for child_node in get_neighbors(curr_node):
+            if child_node not in seen:
+                seen.add(child_node)
+                queue.append(child_node)
+    raise RuntimeError("Could not find a path to the goal")
+
+
+def get_path_to(node: Node) -> typing.List[Pos]:
+    pos_seq = []
+    while node.parent:
+        pos_seq.append(node.pos)
+        node = node.parent
+    pos_seq.reverse()
     return pos_seq
+
+
+def get_path_length(node: Node) -> int:
+    # len(get_path_to(node)) without building the path
+    length = 0
+    while node.parent:
+        length += 1
+        node = node.parent
+    return length
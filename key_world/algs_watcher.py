@@ -1,8 +1,16 @@
 import typing
 import copy
+import time
+import weakref
 import numpy as np
-from key_world.world import World, Pos
-from key_world.algs_knower import Node, find_path, make_get_neighbors
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import repeat
+from key_world.world import World, Pos, hash_world_dict
+from key_world.algs_knower import (
+    Node,
+    make_get_neighbors,
+)
+from key_world.rooms import get_room_graph
 from math import isclose
 
 T = typing.TypeVar("T")
@@ -21,36 +29,293 @@ def normalize(prob_dict: typing.Dict[T, float], alpha: float) -> typing.Dict[T,
     return new_dict
 
 
-def get_knower_path(
-    world: World, knower, goal_key_id: int
-) -> typing.Dict[Pos, typing.List[Pos]]:
+# worlds rebuilt in search worker processes, by content hash, so that searches
+# in a state the worker has seen before reuse its world and room graph
+SEARCH_WORLD_CACHE_SIZE = 16
+search_worlds: typing.Dict[str, World] = {}
+# the states each process pool has been sent a snapshot of
+sent_states: "weakref.WeakKeyDictionary[Executor, typing.Set[str]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class SearchProcessPool(ProcessPoolExecutor):
+    # a process pool that knows its size, since map_searches gives each of its
+    # workers one task
+    def __init__(self, num_workers: int) -> None:
+        super().__init__(max_workers=num_workers)
+        self.num_workers = num_workers
+
+
+def run_searches(
+    search,
+    key: str,
+    snapshot: typing.Optional[typing.Dict[str, typing.Any]],
+    all_args: typing.List[typing.Tuple],
+) -> typing.Optional[typing.List]:
+    # None if this worker needs the snapshot it was not sent
+    world = search_worlds.pop(key, None)
+    if world is None:
+        if snapshot is None:
+            return None
+        world = World.from_dict(snapshot, validate=False)
+    # most recently used last
+    search_worlds[key] = world
+    while len(search_worlds) > SEARCH_WORLD_CACHE_SIZE:
+        del search_worlds[next(iter(search_worlds))]
+    return [search(world, *args) for args in all_args]
+
+
+# part of a turn's search budget for choosing the Watcher's move; predicting the
+# Knower's gets the rest
+MOVE_SEARCH_SHARE = 0.5
+
+
+class SearchBudget:
+    # node expansions ("nodes") or milliseconds ("ms") a Watcher may spend on
+    # its searches in one turn; each phase of the turn gets its part of the
+    # limit up front, every search an even share of what is left of its phase,
+    # and searches return lower bounds for what they could not finish, see
+    # RoomGraph.find_path_lengths
+    def __init__(self, limit: float, unit: str = "nodes") -> None:
+        assert unit in ["nodes", "ms"], f"Unknown budget unit {unit}"
+        assert limit >= 0
+        self.limit = limit
+        self.unit = unit
+        self.start_turn()
+
+    def start_turn(self) -> None:
+        self.nodes = 0
+        # searches cut short this turn
+        self.cuts = 0
+        self.start_time = time.perf_counter()
+        self.phase_end = self.limit
+        self.stop_at = self.limit
+
+    def start_phase(self, end: float) -> None:
+        # the searches that follow may use up to end * limit, counted from the
+        # start of the turn
+        self.phase_end = end * self.limit
+        self.stop_at = self.phase_end
+
+    def spent_ms(self) -> float:
+        return (time.perf_counter() - self.start_time) * 1000
+
+    def spent(self) -> float:
+        return self.nodes if self.unit == "nodes" else self.spent_ms()
+
+    def share(self, num_searches: int) -> None:
+        spent = self.spent()
+        self.stop_at = spent + max(0, self.phase_end - spent) / num_searches
+
+    def expand(self) -> bool:
+        # whether the current search may expand one more node
+        if self.spent() >= self.stop_at:
+            self.cuts += 1
+            return False
+        self.nodes += 1
+        return True
+
+
+def knower_search_length(
+    world,
+    next_node: Node,
+    goal_node: Node,
+    budget: typing.Optional[SearchBudget] = None,
+) -> int:
+    # searches run on the room graph, which gives the same lengths as the
+    # cell-level find_path and find_path_lengths
+    room_graph = get_room_graph(world)
+    return room_graph.find_path_lengths(
+        next_node, [goal_node], key_agnostic=True, budget=budget
+    )[0]
+
+
+def watcher_search_lengths(
+    world,
+    next_node: Node,
+    goal_nodes: typing.List[Node],
+    budget: typing.Optional[SearchBudget] = None,
+) -> typing.List[int]:
+    room_graph = get_room_graph(world)
+    return room_graph.find_path_lengths(next_node, goal_nodes, budget=budget)
+
+
+def map_searches(
+    executor: typing.Optional[Executor],
+    search,
+    world: World,
+    *iterables,
+    budget: typing.Optional[SearchBudget] = None,
+) -> typing.List:
+    # runs independent searches, optionally fanned out over a thread or process
+    # pool; searches only read the world, so threads share it as is, while
+    # worker processes rebuild it from a compact snapshot once per state, see
+    # run_searches
+    if budget is not None:
+        # budgeted searches share one count, so they run one after another
+        all_args = list(zip(*iterables))
+        results = []
+        for i, args in enumerate(all_args):
+            budget.share(len(all_args) - i)
+            results.append(search(world, *args, budget=budget))
+        return results
+    if executor is None:
+        return [search(world, *args) for args in zip(*iterables)]
+    if not isinstance(executor, SearchProcessPool):
+        return list(executor.map(search, repeat(world), *iterables))
+    # one task per worker, with a snapshot only the first time a state is
+    # searched and for workers that have not kept it since
+    all_args = list(zip(*iterables))
+    num_tasks = min(len(all_args), executor.num_workers)
+    tasks = [all_args[i::num_tasks] for i in range(num_tasks)]
+    snapshot = world.to_dict()
+    key = hash_world_dict(snapshot)
+    sent = sent_states.setdefault(executor, set())
+    task_results = list(
+        executor.map(
+            run_searches,
+            repeat(search),
+            repeat(key),
+            repeat(None if key in sent else snapshot),
+            tasks,
+        )
+    )
+    sent.add(key)
+    missed = [i for i, task_result in enumerate(task_results) if task_result is None]
+    if missed:
+        resent = executor.map(
+            run_searches,
+            repeat(search),
+            repeat(key),
+            repeat(snapshot),
+            [tasks[i] for i in missed],
+        )
+        for i, task_result in zip(missed, resent):
+            task_results[i] = task_result
+    # back in the order of the searches
+    ordered: typing.List = [None] * len(all_args)
+    for i, task_result in enumerate(task_results):
+        assert task_result is not None
+        ordered[i::num_tasks] = task_result
+    return ordered
+
+
+def get_knower_path_lengths(
+    world: World,
+    knower,
+    goal_key_ids: typing.List[int],
+    executor: typing.Optional[Executor] = None,
+    budget: typing.Optional[SearchBudget] = None,
+) -> typing.Dict[int, typing.Dict[Pos, int]]:
     start_node = Node(
         pos=knower.pos,
         key_id=knower.key.identifier if knower.key else None,
     )
-    goal_node = Node(
-        pos=Pos((world.maindoor.pos[0], world.maindoor.pos[1] - 1)),
-        key_id=goal_key_id,
-    )
-    all_paths = {}
     stay_node = copy.deepcopy(start_node)
     stay_node.parent = start_node
     get_neighbors = make_get_neighbors(world, key_agnostic=True)
     possible_nodes = get_neighbors(start_node) + [stay_node]
-    for next_node in possible_nodes:
-        path = find_path(next_node, goal_node, get_neighbors)
-        all_paths[next_node.pos] = path
-    return all_paths
+    searches = [
+        (
+            goal,
+            next_node,
+            Node(
+                pos=Pos((world.maindoor.pos[0], world.maindoor.pos[1] - 1)),
+                key_id=goal,
+            ),
+        )
+        for goal in goal_key_ids
+        for next_node in possible_nodes
+    ]
+    lengths = map_searches(
+        executor,
+        knower_search_length,
+        world,
+        [next_node for _, next_node, _ in searches],
+        [goal_node for _, _, goal_node in searches],
+        budget=budget,
+    )
+    all_lengths: typing.Dict[int, typing.Dict[Pos, int]] = {
+        goal: {} for goal in goal_key_ids
+    }
+    for (goal, next_node, _), length in zip(searches, lengths):
+        all_lengths[goal][next_node.pos] = length
+    return all_lengths
+
+
+class KnowerDistances:
+    # per-goal path lengths from the Knower's next positions, shared by belief
+    # initialization, prediction and update; recomputed only when the Knower's
+    # position or held key, or the world's keys and doors, change; lengths cut
+    # short by a budget are only lower bounds, so they are not kept and the
+    # next turn searches again
+    def __init__(self, world: World, executor: typing.Optional[Executor] = None):
+        self.world = world
+        self.executor = executor
+        self.state: typing.Optional[typing.Tuple] = None
+        self.lengths: typing.Dict[int, typing.Dict[Pos, int]] = {}
+
+    def get_many(
+        self,
+        knower,
+        goal_key_ids: typing.Iterable[int],
+        budget: typing.Optional[SearchBudget] = None,
+    ) -> typing.Dict[int, typing.Dict[Pos, int]]:
+        state = (
+            knower.pos,
+            knower.key.identifier if knower.key else None,
+            self.world.version,
+        )
+        if state != self.state:
+            self.state = state
+            self.lengths = {}
+        goal_key_ids = list(goal_key_ids)
+        missing = [goal for goal in goal_key_ids if goal not in self.lengths]
+        lengths = {goal: self.lengths[goal] for goal in self.lengths}
+        if missing:
+            cuts = budget.cuts if budget else 0
+            lengths.update(
+                get_knower_path_lengths(
+                    self.world, knower, missing, self.executor, budget
+                )
+            )
+            if not budget or budget.cuts == cuts:
+                self.lengths = lengths
+        return {goal: lengths[goal] for goal in goal_key_ids}
+
+    def get(self, knower, goal_key_id: int) -> typing.Dict[Pos, int]:
+        return self.get_many(knower, [goal_key_id])[goal_key_id]
 
 
-def init_beliefs(world: World, knower, alpha: float) -> typing.Dict[int, float]:
+def get_potential_goals(world: World, knower) -> typing.Set[int]:
     potential_goals = set(k.identifier for k in world.keys)
     if knower.key:
         potential_goals.add(knower.key.identifier)
-    shortest_path_lengths = {}
-    for goal in potential_goals:
-        paths_to_goal = get_knower_path(world, knower, goal)
-        shortest_path_lengths[goal] = min(len(p) for p in paths_to_goal)
+    return potential_goals
+
+
+def init_beliefs(
+    world: World,
+    knower,
+    alpha: float,
+    distances: typing.Optional[KnowerDistances] = None,
+    distance_prior: bool = False,
+) -> typing.Dict[int, float]:
+    potential_goals = get_potential_goals(world, knower)
+    if distance_prior:
+        # closer goals start out likelier
+        if distances is None:
+            distances = KnowerDistances(world)
+        all_lengths = distances.get_many(knower, potential_goals)
+        shortest_path_lengths = {
+            goal: min(all_lengths[goal].values()) for goal in potential_goals
+        }
+    else:
+        # the model as it was fit: it measured the length of each goal's next
+        # positions rather than of the paths from them, which is 2 for every
+        # goal, so all goals start out equally likely
+        shortest_path_lengths = {goal: 2 for goal in potential_goals}
     total_len = sum(shortest_path_lengths.values())
     beliefs = {
         goal: 1 - (length / total_len) for goal, length in shortest_path_lengths.items()
@@ -59,31 +324,68 @@ def init_beliefs(world: World, knower, alpha: float) -> typing.Dict[int, float]:
     return beliefs
 
 
-def get_p_next_given_goal_from_paths(
-    paths: typing.Dict[Pos, typing.List[Pos]], alpha: float
+def get_p_next_given_goal_from_lengths(
+    lengths: typing.Mapping[Pos, float], alpha: float
 ) -> typing.Dict[Pos, float]:
-    total_len = sum(len(path) for path in paths.values())
+    total_len = sum(lengths.values())
     assert total_len > 0
     p_next_given_goal = {
-        next_pos: 1 - (len(path) / total_len) for next_pos, path in paths.items()
+        next_pos: 1 - (length / total_len) for next_pos, length in lengths.items()
     }
     p_next_given_goal = normalize(p_next_given_goal, alpha)
     return p_next_given_goal
 
 
+def prune_beliefs(
+    beliefs: typing.Dict[int, float], belief_epsilon: float
+) -> typing.Tuple[typing.Dict[int, float], float]:
+    # drop goals whose belief is below belief_epsilon (never the most likely one)
+    # and renormalize the rest; the dropped mass bounds the approximation error
+    if belief_epsilon <= 0:
+        return beliefs, 0.0
+    best_goal = max(beliefs, key=beliefs.get)  # type: ignore[arg-type]
+    kept = {
+        goal: p
+        for goal, p in beliefs.items()
+        if p >= belief_epsilon or goal == best_goal
+    }
+    if len(kept) == len(beliefs):
+        return beliefs, 0.0
+    pruned_mass = sum(p for goal, p in beliefs.items() if goal not in kept)
+    total = sum(kept.values())
+    return {goal: p / total for goal, p in kept.items()}, pruned_mass
+
+
 def get_all_p_next_given_goals(
-    world: World, knower, beliefs, alpha: float
+    world: World,
+    knower,
+    beliefs,
+    alpha: float,
+    distances: typing.Optional[KnowerDistances] = None,
+    budget: typing.Optional[SearchBudget] = None,
 ) -> typing.Dict[int, typing.Dict[Pos, float]]:
+    if distances is None:
+        distances = KnowerDistances(world)
+    all_lengths = distances.get_many(knower, beliefs, budget)
     p_next_given_goals = {}
     for goal in beliefs:
-        paths_to_goal = get_knower_path(world, knower, goal)
-        p_next_given_goal = get_p_next_given_goal_from_paths(paths_to_goal, alpha)
+        lengths_to_goal = all_lengths[goal]
+        p_next_given_goal = get_p_next_given_goal_from_lengths(lengths_to_goal, alpha)
         p_next_given_goals[goal] = p_next_given_goal
     return p_next_given_goals
 
 
-def predict_knower_move(world: World, knower, beliefs, alpha: float):
-    p_next_given_goals = get_all_p_next_given_goals(world, knower, beliefs, alpha)
+def predict_knower_move(
+    world: World,
+    knower,
+    beliefs,
+    alpha: float,
+    distances: typing.Optional[KnowerDistances] = None,
+    budget: typing.Optional[SearchBudget] = None,
+):
+    p_next_given_goals = get_all_p_next_given_goals(
+        world, knower, beliefs, alpha, distances, budget=budget
+    )
     p_next = infer_knower_move(beliefs, p_next_given_goals)
     return p_next, p_next_given_goals
 
@@ -99,26 +401,42 @@ def infer_knower_move(p_goal_priors, p_nexts_given_goals):
     return p_nexts
 
 
-def choose_move_given_beliefs(watcher, world, beliefs, alpha: float):
+def choose_move_given_beliefs(
+    watcher,
+    world,
+    beliefs,
+    alpha: float,
+    executor: typing.Optional[Executor] = None,
+    budget: typing.Optional[SearchBudget] = None,
+):
     start_node = Node(
         pos=watcher.pos,
         key_id=watcher.key.identifier if watcher.key else None,
     )
-    paths = {}
     get_neighbors = make_get_neighbors(world)
     stay = copy.deepcopy(start_node)
     stay.parent = start_node
     available_nodes = get_neighbors(start_node) + [stay]
     p_nexts_watcher = {node.pos: 0 for node in available_nodes}
+    goals = list(beliefs)
+    goal_nodes = [Node(pos=world.maindoor.pos, key_id=goal) for goal in goals]
+    lengths: typing.Dict[int, typing.Dict[Pos, int]] = {goal: {} for goal in goals}
+    # the searches for different goals only differ in the key held at the end
+    all_lengths = map_searches(
+        executor,
+        watcher_search_lengths,
+        world,
+        available_nodes,
+        repeat(goal_nodes),
+        budget=budget,
+    )
+    for next_node, next_lengths in zip(available_nodes, all_lengths):
+        for goal, length in zip(goals, next_lengths):
+            lengths[goal][next_node.pos] = length
     for potential_goal in beliefs:
-        goal_node = Node(
-            pos=world.maindoor.pos,
-            key_id=potential_goal,
+        p_nexts_given_goal_watcher = get_p_next_given_goal_from_lengths(
+            lengths[potential_goal], alpha
         )
-        for next_node in available_nodes:
-            path = find_path(next_node, goal_node, get_neighbors)
-            paths[next_node.pos] = path
-        p_nexts_given_goal_watcher = get_p_next_given_goal_from_paths(paths, alpha)
         for next_pos in p_nexts_given_goal_watcher:
             p_nexts_watcher[next_pos] += (
                 p_nexts_given_goal_watcher[next_pos] * beliefs[potential_goal]
@@ -127,13 +445,307 @@ def choose_move_given_beliefs(watcher, world, beliefs, alpha: float):
     return p_nexts_watcher
 
 
+# world states (see World.fingerprint) whose search results a Planner keeps
+PLANNER_CACHE_SIZE = 16
+
+
+class Planner:
+    # Depth-limited lookahead for the model Watcher over both agents' moves.
+    # Every potential goal gets its own expected number of turns until both
+    # agents are at the main door with its key: the Knower moves as predicted
+    # for that goal, the Watcher picks the move that is best in expectation
+    # under the current beliefs, and leaves fall back to the longer of the two
+    # shortest paths. Moves are tried on the world itself and undone (see
+    # World.lookahead), and states reached along different lines share their
+    # value through a transposition table. Searches go one depth deeper at a
+    # time until the node budget runs out, and the moves are compared on the
+    # deepest one that finished; past the budget, states are no longer
+    # expanded but scored as leaves, and values that depend on them are not
+    # kept in the table.
+    def __init__(self, world: World, alpha: float, depth: int, budget: int) -> None:
+        assert depth >= 1 and budget >= 1
+        self.world = world
+        self.alpha = alpha
+        self.depth = depth
+        self.budget = budget
+        self.goals: typing.List[int] = []
+        self.weights = np.zeros(0)
+        self.table: typing.Dict[typing.Tuple, typing.Tuple[int, np.ndarray]] = {}
+        self.nodes = 0
+        # fingerprints of the world versions seen while planning this turn
+        self.fingerprints: typing.Dict[int, typing.Tuple] = {}
+        # search results do not depend on the beliefs, so they are kept across
+        # turns, Knower's and Watcher's by agent state, for the most recently
+        # used PLANNER_CACHE_SIZE world states
+        self.lengths: typing.Dict[
+            typing.Tuple, typing.Tuple[typing.Dict, typing.Dict]
+        ] = {}
+
+    def plan(
+        self, watcher, knower, beliefs: typing.Dict[int, float]
+    ) -> typing.Tuple[typing.Dict[Pos, float], int]:
+        # expected turns until the main door opens after each of the Watcher's
+        # moves, and the number of states expanded to find them
+        self.goals = list(beliefs)
+        self.weights = np.array([beliefs[goal] for goal in self.goals])
+        self.nodes = 0
+        self.fingerprints = {}
+        # every move is scored by a search of the same depth
+        costs: typing.Dict[Pos, float] = {}
+        for depth in range(1, self.depth + 1):
+            self.table = {}
+            depth_costs = {}
+            with self.world.lookahead():
+                for pos, door in self.get_options(watcher):
+                    self.world.apply(watcher, pos, door)
+                    try:
+                        depth_costs[pos] = float(
+                            self.weights @ self.knower_turn(watcher, knower, depth)
+                        )
+                    finally:
+                        self.world.undo()
+            if self.nodes >= self.budget and costs:
+                break
+            costs = depth_costs
+        return costs, self.nodes
+
+    def get_options(self, agent, key_agnostic: bool = False):
+        # the moves make_get_neighbors allows from agent's state, and staying
+        key_ids: typing.Set[typing.Optional[int]] = {
+            agent.key.identifier if agent.key else None
+        }
+        if key_agnostic and agent.key:
+            key_ids.update(k.identifier for k in self.world.keys)
+        options = {}
+        for key_id in key_ids:
+            for pos, door in self.world.get_accessible_neighbors(agent.pos, key_id):
+                options[pos] = door
+        options[agent.pos] = None
+        return list(options.items())
+
+    def get_state(self, agent) -> typing.Tuple:
+        version = self.world.version
+        if version not in self.fingerprints:
+            self.fingerprints[version] = self.world.fingerprint()
+        return (
+            agent.pos,
+            agent.key.identifier if agent.key else None,
+            self.fingerprints[version],
+        )
+
+    def get_cached_lengths(self, agent, is_knower: bool) -> typing.Dict:
+        # the cached lengths for agent's state, most recently used world state last
+        pos, key_id, fingerprint = self.get_state(agent)
+        caches = self.lengths.pop(fingerprint, None) or ({}, {})
+        self.lengths[fingerprint] = caches
+        while len(self.lengths) > PLANNER_CACHE_SIZE:
+            del self.lengths[next(iter(self.lengths))]
+        return caches[0 if is_knower else 1].setdefault((pos, key_id), {})
+
+    def get_knower_lengths(self, knower) -> typing.Dict[int, typing.Dict[Pos, int]]:
+        # as get_knower_path_lengths, with one search per move for all goals
+        lengths = self.get_cached_lengths(knower, is_knower=True)
+        missing = [goal for goal in self.goals if goal not in lengths]
+        if missing:
+            start_node = Node(
+                pos=knower.pos,
+                key_id=knower.key.identifier if knower.key else None,
+            )
+            stay_node = copy.deepcopy(start_node)
+            stay_node.parent = start_node
+            get_neighbors = make_get_neighbors(self.world, key_agnostic=True)
+            goal_pos = Pos((self.world.maindoor.pos[0], self.world.maindoor.pos[1] - 1))
+            goal_nodes = [Node(pos=goal_pos, key_id=goal) for goal in missing]
+            room_graph = get_room_graph(self.world)
+            for goal in missing:
+                lengths[goal] = {}
+            for next_node in get_neighbors(start_node) + [stay_node]:
+                next_lengths = room_graph.find_path_lengths(
+                    next_node, goal_nodes, key_agnostic=True
+                )
+                for goal, length in zip(missing, next_lengths):
+                    lengths[goal][next_node.pos] = length
+        return lengths
+
+    def get_watcher_lengths(self, watcher) -> typing.Dict[int, int]:
+        lengths = self.get_cached_lengths(watcher, is_knower=False)
+        missing = [goal for goal in self.goals if goal not in lengths]
+        if missing:
+            start_node = Node(
+                pos=watcher.pos,
+                key_id=watcher.key.identifier if watcher.key else None,
+            )
+            goal_nodes = [Node(pos=self.world.maindoor.pos, key_id=g) for g in missing]
+            room_graph = get_room_graph(self.world)
+            lengths.update(
+                zip(missing, room_graph.find_path_lengths(start_node, goal_nodes))
+            )
+        return lengths
+
+    def leaf(self, watcher, knower) -> np.ndarray:
+        watcher_lengths = self.get_watcher_lengths(watcher)
+        knower_lengths = self.get_knower_lengths(knower)
+        # staying put is one move more than the Knower's distance to the door
+        return np.array(
+            [
+                max(watcher_lengths[goal], knower_lengths[goal][knower.pos] - 1)
+                for goal in self.goals
+            ],
+            dtype=float,
+        )
+
+    def is_done(self, watcher, knower) -> np.ndarray:
+        # per goal, whether the door would open now if that were the main door key
+        x, y = self.world.maindoor.pos
+        return np.array(
+            [
+                all(
+                    agent.pos[0] == x
+                    and agent.pos[1] in (y, y - 1)
+                    and agent.key is not None
+                    and agent.key.identifier == goal
+                    for agent in (watcher, knower)
+                )
+                for goal in self.goals
+            ],
+            dtype=bool,
+        )
+
+    def watcher_turn(self, watcher, knower, depth: int) -> np.ndarray:
+        if depth == 0 or self.nodes >= self.budget:
+            return self.leaf(watcher, knower)
+        state = (self.get_state(watcher), self.get_state(knower))
+        entry = self.table.get(state)
+        if entry is not None and entry[0] >= depth:
+            return entry[1]
+        self.nodes += 1
+        best_value = None
+        best_cost = np.inf
+        for pos, door in self.get_options(watcher):
+            self.world.apply(watcher, pos, door)
+            try:
+                value = self.knower_turn(watcher, knower, depth)
+            finally:
+                self.world.undo()
+            cost = self.weights @ value
+            if cost < best_cost:
+                best_value, best_cost = value, cost
+        assert best_value is not None
+        # once the budget runs out, states below this one were scored as leaves
+        # before their depth, and their values are not good for depth
+        if self.nodes < self.budget:
+            self.table[state] = (depth, best_value)
+        return best_value
+
+    def knower_turn(self, watcher, knower, depth: int) -> np.ndarray:
+        # one more turn for every goal, plus what follows each of the Knower's
+        # moves weighted by how likely it is under that goal
+        lengths = self.get_knower_lengths(knower)
+        p_nexts = {
+            goal: get_p_next_given_goal_from_lengths(lengths[goal], self.alpha)
+            for goal in self.goals
+        }
+        value = np.ones(len(self.goals))
+        for pos, door in self.get_options(knower, key_agnostic=True):
+            p_next = np.array([p_nexts[goal][pos] for goal in self.goals])
+            self.world.apply(knower, pos, door)
+            try:
+                done = self.is_done(watcher, knower)
+                if not done.all():
+                    following = self.watcher_turn(watcher, knower, depth - 1)
+                    value += p_next * np.where(done, 0, following)
+            finally:
+                self.world.undo()
+        return value
+
+
+class GoalParticles:
+    # A weighted sample of goal hypotheses standing in for exact beliefs, so
+    # that paths are only searched for goals that still have particles. They
+    # start out as the exact beliefs they are given. Every
+    # update reweights the particles by how likely the Knower's move was under
+    # their goal; once the effective sample size falls below
+    # resample_threshold * num_particles they are resampled (systematically)
+    # onto the likelier goals and the rest drop out.
+    def __init__(
+        self,
+        beliefs: typing.Dict[int, float],
+        num_particles: int,
+        rng: np.random.Generator,
+        resample_threshold: float = 0.5,
+    ) -> None:
+        assert num_particles > 0
+        assert 0 <= resample_threshold <= 1
+        self.rng = rng
+        self.resample_threshold = resample_threshold
+        # particles go round the potential goals in turn, so every goal starts
+        # with some as long as there are at least as many particles as goals,
+        # and share its belief between them; they are kept in order of goal,
+        # since the evenly spaced draws of resample would alias with goals
+        # that take turns
+        self.goals = np.sort(np.resize(np.array(sorted(beliefs)), num_particles))
+        goals, inverse, counts = np.unique(
+            self.goals, return_inverse=True, return_counts=True
+        )
+        weights = np.array([beliefs[goal] for goal in goals.tolist()]) / counts
+        self.weights = weights[inverse] / weights[inverse].sum()
+        self.num_resamples = 0
+
+    def get_beliefs(self) -> typing.Dict[int, float]:
+        # total weight per goal that has particles
+        goals, inverse = np.unique(self.goals, return_inverse=True)
+        weights = np.bincount(inverse, weights=self.weights, minlength=len(goals))
+        return dict(zip(goals.tolist(), weights.tolist()))
+
+    def effective_sample_size(self) -> float:
+        return 1 / np.sum(self.weights**2)
+
+    def update(
+        self, knower, p_action_given_goal: typing.Dict[int, typing.Dict[Pos, float]]
+    ) -> None:
+        # goals pruned before predicting (see prune_beliefs) drop out
+        goals, inverse = np.unique(self.goals, return_inverse=True)
+        likelihoods = np.array(
+            [
+                p_action_given_goal[goal][knower.pos]
+                if goal in p_action_given_goal
+                else 0.0
+                for goal in goals.tolist()
+            ]
+        )
+        weights = self.weights * likelihoods[inverse]
+        total = weights.sum()
+        assert total > 0, "No particle explains the Knower's move"
+        self.weights = weights / total
+        if self.effective_sample_size() < self.resample_threshold * len(self.goals):
+            self.resample()
+
+    def resample(self) -> None:
+        num_particles = len(self.goals)
+        positions = (self.rng.random() + np.arange(num_particles)) / num_particles
+        cumulative = np.cumsum(self.weights)
+        cumulative[-1] = 1.0
+        self.goals = self.goals[np.searchsorted(cumulative, positions)]
+        self.weights = np.full(num_particles, 1 / num_particles)
+        self.num_resamples += 1
+
+
 def update_beliefs(knower, predictions, current_beliefs):
     p_action, p_action_given_goal = predictions
+    live_mass = 1.0
+    if len(p_action_given_goal) < len(current_beliefs):
+        # goals pruned before predicting (see prune_beliefs) drop out for good:
+        # their belief becomes 0, which no later update can raise again
+        live_mass = sum(current_beliefs[goal] for goal in p_action_given_goal)
     new_beliefs = {}
     for goal in current_beliefs:
+        if goal not in p_action_given_goal:
+            new_beliefs[goal] = 0.0
+            continue
         new_beliefs[goal] = (
             p_action_given_goal[goal][knower.pos]
             * current_beliefs[goal]
+            / live_mass
             / p_action[knower.pos]
         )
     confirm_normalized(new_beliefs)
@@ -1,11 +1,22 @@
 import pandas as pd  # type: ignore[import-untyped]
 import argparse
 import pathlib
+import hashlib
+import json
+import matplotlib
+
+matplotlib.use("Agg")  # figures are only ever saved, possibly from worker processes
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import seaborn as sns  # type: ignore[import-untyped]
 import numpy as np
-from scipy.stats import pearsonr  # type: ignore[import-untyped]
+from scipy.stats import pearsonr, t as t_dist  # type: ignore[import-untyped]
 from key_world.game import Game
+from key_world.world import all_worlds, load_world_suite
+from key_world.manifest import check_manifests
+from key_world.beliefs import BeliefStore, beliefs_to_array
 
 
 def format_col(col):
@@ -33,34 +44,57 @@ def format_settings(update_criteria, alpha):
     return rf"{format_update(update_criteria)}, {format_alpha(alpha)}"
 
 
+def get_file_settings(file, mode):
+    # every csv holds a single game, identified by its file name
+    if mode == "human":
+        subj, idx_str = file.stem.split("_")
+        return {"subj": subj, "world": int(idx_str)}
+    elif mode == "model":
+        update_criteria_str, alpha_str, idx_str = file.stem.split("_")
+        return {
+            "world": int(idx_str),
+            "alpha": int(float(alpha_str.split("=")[1])),
+            "update_criteria": eval(update_criteria_str.split("=")[1]),
+        }
+    elif mode == "replay":
+        subj, idx, update_criteria_str, alpha_str = file.stem.split("_")
+        return {
+            "subj": subj,
+            "world": int(idx),
+            "alpha": int(float(alpha_str.split("=")[1])),
+            "update_criteria": eval(update_criteria_str.split("=")[1]),
+        }
+    else:
+        return NotImplemented
+
+
 def extract_data(input_folder, mode):
     dfs = []
-    for file in pathlib.Path(input_folder).iterdir():
+    for file in pathlib.Path(input_folder).glob("*.csv"):
         df = pd.read_csv(file)
-        if mode == "human":
-            df["subj"], idx_str = file.stem.split("_")
-            df["world"] = int(idx_str)
-        elif mode == "model":
-            update_criteria_str, alpha_str, idx_str = file.stem.split("_")
+        if mode == "model" and "beliefs" in df:
+            # older runs kept beliefs as text, see BeliefStore for newer ones
             df["beliefs"] = df["beliefs"].apply(eval)
-            df["world"] = int(idx_str)
-            df["alpha"] = int(float(alpha_str.split("=")[1]))
-            df["update_criteria"] = [eval(update_criteria_str.split("=")[1])] * len(
-                df.index
-            )
-        elif mode == "replay":
-            df["subj"], idx, update_criteria_str, alpha_str = file.stem.split("_")
-            df["world"] = int(idx)
-            df["alpha"] = int(float(alpha_str.split("=")[1]))
-            df["update_criteria"] = [eval(update_criteria_str.split("=")[1])] * len(
-                df.index
-            )
-        else:
-            return NotImplemented
+        for col, value in get_file_settings(file, mode).items():
+            df[col] = [value] * len(df.index)
         dfs.append(df)
     return pd.concat(dfs)
 
 
+def get_door_cells(input_folder):
+    # per world, the cells from which the Watcher and the Knower open the main
+    # door, as they are logged; folders without a suite hold the built-in worlds
+    suite_file = pathlib.Path(input_folder) / "worlds.json"
+    worlds = load_world_suite(suite_file) if suite_file.exists() else all_worlds
+    return [
+        (
+            str(world.maindoor.pos),
+            str((world.maindoor.pos[0], world.maindoor.pos[1] - 1)),
+        )
+        for world in worlds
+    ]
+
+
 def moves_until_pos(move_list, pos_str, is_watcher):
     if is_watcher and len(move_list) == 100:
         return 100
@@ -70,22 +104,26 @@ def moves_until_pos(move_list, pos_str, is_watcher):
     return i
 
 
-def get_performance(data, groupby, avg_over=[]):
+def get_performance(data, door_cells, groupby, avg_over=[]):
+    # door_cells as from get_door_cells for the folder data was read from
     knower_moves = data.groupby(groupby + avg_over, as_index=False)["knower_pos"].apply(
         list
     )
     watcher_moves = data.groupby(groupby + avg_over, as_index=False)[
         "watcher_pos"
     ].apply(list)
+    games = data.groupby(groupby + avg_over, as_index=False)["world"].first()
     watcher_moves["num_rounds"] = watcher_moves["watcher_pos"].apply(len)
     assert all(watcher_moves["num_rounds"] <= 100)
     watcher_moves["solved"] = watcher_moves["num_rounds"] < 100
-    watcher_moves["watcher_door_speed"] = watcher_moves["watcher_pos"].apply(
-        lambda moves: moves_until_pos(moves, "(9, 10)", is_watcher=True)
-    )
-    watcher_moves["knower_door_speed"] = knower_moves["knower_pos"].apply(
-        lambda moves: moves_until_pos(moves, "(9, 9)", is_watcher=False)
-    )
+    watcher_moves["watcher_door_speed"] = [
+        moves_until_pos(moves, door_cells[world][0], is_watcher=True)
+        for moves, world in zip(watcher_moves["watcher_pos"], games["world"])
+    ]
+    watcher_moves["knower_door_speed"] = [
+        moves_until_pos(moves, door_cells[world][1], is_watcher=False)
+        for moves, world in zip(knower_moves["knower_pos"], games["world"])
+    ]
     watcher_moves["speed_ratio"] = (
         watcher_moves["knower_door_speed"] / watcher_moves["watcher_door_speed"]
     )
@@ -110,7 +148,107 @@ def get_performance(data, groupby, avg_over=[]):
     return summary.sort_index()
 
 
-def get_comparison(data, groupby, avg_over=[]):
+def centered_sums(x, y):
+    # n, the means of x and y, and the sums of squares and products of their
+    # deviations from them
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if len(x) == 0:
+        return np.zeros(6)
+    dx, dy = x - x.mean(), y - y.mean()
+    return np.array(
+        [len(x), x.mean(), y.mean(), (dx * dx).sum(), (dy * dy).sum(), (dx * dy).sum()]
+    )
+
+
+def merge_centered_sums(sums, counts):
+    # centered_sums of batches (rows of sums) merged as if each had been taken
+    # counts times, without the cancellation of raw sums; counts may have
+    # leading axes for many merges at once
+    n, mean_x, mean_y, m2_x, m2_y, c_xy = np.moveaxis(sums, -1, 0)
+    weights = counts * n
+    total = weights.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        merged_x = (weights * mean_x).sum(axis=-1) / np.where(total > 0, total, 1)
+        merged_y = (weights * mean_y).sum(axis=-1) / np.where(total > 0, total, 1)
+    dx = mean_x - merged_x[..., None]
+    dy = mean_y - merged_y[..., None]
+    return np.stack(
+        [
+            total,
+            merged_x,
+            merged_y,
+            counts @ m2_x + (weights * dx * dx).sum(axis=-1),
+            counts @ m2_y + (weights * dy * dy).sum(axis=-1),
+            counts @ c_xy + (weights * dx * dy).sum(axis=-1),
+        ],
+        axis=-1,
+    )
+
+
+def correlation_from_sums(sums):
+    _, _, _, m2_x, m2_y, c_xy = np.moveaxis(sums, -1, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return c_xy / np.sqrt(m2_x * m2_y)
+
+
+def unit_statistics(log_likelihood, goal_surprisal, action_surprisal, reaction_time):
+    # one recording's average log likelihood, then the centered_sums of each
+    # surprisal and the reaction times over the turns after the first
+    y = np.asarray(reaction_time, dtype=float)[1:]
+    stats = [np.array([np.mean(log_likelihood)])]
+    for surprisal in [goal_surprisal, action_surprisal]:
+        stats.append(centered_sums(np.asarray(surprisal, dtype=float)[1:], y))
+    return np.concatenate(stats)
+
+
+def bootstrap_cis(units, num_resamples, seed=0, confidence=0.95):
+    # percentile intervals from resampling whole recordings (rows of
+    # unit_statistics), all resamples at once: each resample is a row of
+    # counts, which merge_centered_sums takes all rows of at once
+    rng = np.random.default_rng(seed)
+    num_units = len(units)
+    indices = rng.integers(0, num_units, size=(num_resamples, num_units))
+    offsets = np.arange(num_resamples)[:, None] * num_units
+    counts = np.bincount(
+        (indices + offsets).ravel(), minlength=num_resamples * num_units
+    ).reshape(num_resamples, num_units)
+    resampled = {
+        "avg_log_likelihood": counts @ units[:, 0] / num_units,
+        "goal_correlation_r": correlation_from_sums(
+            merge_centered_sums(units[:, 1:7], counts)
+        ),
+        "action_correlation_r": correlation_from_sums(
+            merge_centered_sums(units[:, 7:13], counts)
+        ),
+    }
+    tails = [50 * (1 - confidence), 50 * (1 + confidence)]
+    cis = {}
+    for col, values in resampled.items():
+        cis[f"{col}_ci_low"], cis[f"{col}_ci_high"] = np.nanpercentile(values, tails)
+    return cis
+
+
+def get_bootstrap_cis(units_by_key, num_resamples, seed=0, executor=None):
+    # units_by_key maps each setting to {recording: unit_statistics}; units
+    # are ordered by recording, so every setting and both analysis modes draw
+    # the same resamples; optionally spread over a process pool
+    keys = list(units_by_key)
+    units = [
+        np.array([stats for _, stats in sorted(units_by_key[key].items())])
+        for key in keys
+    ]
+    args = (units, repeat(num_resamples), repeat(seed))
+    if executor is None:
+        results = list(map(bootstrap_cis, *args))
+    else:
+        results = list(executor.map(bootstrap_cis, *args))
+    return dict(zip(keys, results))
+
+
+def get_comparison(data, groupby, avg_over=[], num_resamples=0, seed=0, executor=None):
+    # bootstrap intervals resample the units avg_over averages over, the
+    # recordings for avg_over=["subj", "world"] as in stream_comparison
+    assert num_resamples == 0 or avg_over, "Resampling needs units to avg_over"
     g = data.groupby(groupby + avg_over, as_index=False)
     df = g["log_likelihood"].apply(list)
     df["action_surprisal"] = g["action_surprisal"].apply(list)["action_surprisal"]
@@ -131,6 +269,7 @@ def get_comparison(data, groupby, avg_over=[]):
     summary["goal_correlation_p"] = 0.0
     summary["action_correlation_r"] = 0.0
     summary["action_correlation_p"] = 0.0
+    units_by_key = {}
     for idx, group in df.groupby(groupby):
         all_goal_surprisals = sum(
             (seq[1:] for seq in group["goal_surprisal"].values), []
@@ -139,127 +278,434 @@ def get_comparison(data, groupby, avg_over=[]):
             (seq[1:] for seq in group["action_surprisal"].values), []
         )
         all_reaction_times = sum((seq[1:] for seq in group["reaction_time"].values), [])
-        (
-            summary["goal_correlation_r"][idx],
-            summary["goal_correlation_p"][idx],
-        ) = pearsonr(all_goal_surprisals, all_reaction_times)
-        (
-            summary["action_correlation_r"][idx],
-            summary["action_correlation_p"][idx],
-        ) = pearsonr(all_action_surprisals, all_reaction_times)
+        goal_r, goal_p = pearsonr(all_goal_surprisals, all_reaction_times)
+        action_r, action_p = pearsonr(all_action_surprisals, all_reaction_times)
+        summary.loc[idx, "goal_correlation_r"] = goal_r
+        summary.loc[idx, "goal_correlation_p"] = goal_p
+        summary.loc[idx, "action_correlation_r"] = action_r
+        summary.loc[idx, "action_correlation_p"] = action_p
+        if num_resamples > 0:
+            # one unit per row, that is per combination of the avg_over columns
+            units_by_key[idx] = {
+                tuple(row[: len(avg_over)]): unit_statistics(*row[len(avg_over) :])
+                for row in group[
+                    avg_over
+                    + [
+                        "log_likelihood",
+                        "goal_surprisal",
+                        "action_surprisal",
+                        "reaction_time",
+                    ]
+                ].values
+            }
+    if num_resamples > 0:
+        cis = get_bootstrap_cis(units_by_key, num_resamples, seed, executor)
+        for idx, group_cis in cis.items():
+            for col, value in group_cis.items():
+                summary.loc[idx, col] = value
     return summary.reset_index()
 
 
-def make_heatmaps(output_folder, summary, groupby, metric_cols):
+class RunningCorrelation:
+    # pearson r over batches of samples without keeping them, merging the
+    # batches' centered sums so large sweeps stay numerically stable
+    def __init__(self):
+        self.sums = np.zeros(6)
+
+    def add(self, x, y):
+        self.sums = merge_centered_sums(
+            np.stack([self.sums, centered_sums(x, y)]), np.ones(2)
+        )
+
+    def result(self):
+        # same r and two-sided p as pearsonr
+        r = float(np.clip(correlation_from_sums(self.sums), -1.0, 1.0))
+        df = int(self.sums[0]) - 2
+        if abs(r) == 1.0:
+            return r, 0.0
+        t = r * np.sqrt(df / (1.0 - r * r))
+        return r, float(2 * t_dist.sf(abs(t), df))
+
+
+def unit_performance(watcher_moves, knower_moves, door_cells):
+    # the per-game columns get_performance averages, door_cells being those of
+    # the game's world
+    num_rounds = len(watcher_moves)
+    assert num_rounds <= 100
+    watcher_door_speed = moves_until_pos(watcher_moves, door_cells[0], is_watcher=True)
+    knower_door_speed = moves_until_pos(knower_moves, door_cells[1], is_watcher=False)
+    return {
+        "num_rounds": num_rounds,
+        "solved": num_rounds < 100,
+        "watcher_door_speed": watcher_door_speed,
+        "knower_door_speed": knower_door_speed,
+        "speed_ratio": knower_door_speed / watcher_door_speed,
+        "speed_diff": knower_door_speed - watcher_door_speed,
+    }
+
+
+def stream_performance(input_folder, mode, groupby):
+    # get_performance(extract_data(...)) one file at a time, keeping only
+    # running sums per group
+    door_cells = get_door_cells(input_folder)
+    sums = {}
+    for file in pathlib.Path(input_folder).glob("*.csv"):
+        settings = get_file_settings(file, mode)
+        df = pd.read_csv(file, usecols=["watcher_pos", "knower_pos"])
+        metrics = unit_performance(
+            list(df["watcher_pos"]),
+            list(df["knower_pos"]),
+            door_cells[settings["world"]],
+        )
+        key = tuple(settings[col] for col in groupby)
+        group_sums, count = sums.get(key, ({}, 0))
+        for col, value in metrics.items():
+            group_sums[col] = group_sums.get(col, 0.0) + value
+        sums[key] = (group_sums, count + 1)
+    rows = []
+    for key in sorted(sums, key=str):
+        group_sums, count = sums[key]
+        row = dict(zip(groupby, key))
+        row.update({col: value / count for col, value in group_sums.items()})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def stream_comparison(input_folder, groupby, num_resamples=0, seed=0, executor=None):
+    # get_comparison(extract_data(..., mode="replay"), ...) one file at a time
+    groups = {}
+    units_by_key = {}
+    for file in pathlib.Path(input_folder).glob("*.csv"):
+        settings = get_file_settings(file, "replay")
+        df = pd.read_csv(
+            file,
+            usecols=[
+                "log_likelihood",
+                "action_surprisal",
+                "goal_surprisal",
+                "reaction_time",
+            ],
+        )
+        key = tuple(settings[col] for col in groupby)
+        if key not in groups:
+            groups[key] = [0.0, 0, RunningCorrelation(), RunningCorrelation()]
+        group = groups[key]
+        group[0] += df["log_likelihood"].mean()
+        group[1] += 1
+        # the first turn has no predictions to be surprised by
+        group[2].add(df["goal_surprisal"].values[1:], df["reaction_time"].values[1:])
+        group[3].add(df["action_surprisal"].values[1:], df["reaction_time"].values[1:])
+        units_by_key.setdefault(key, {})[
+            (settings["subj"], settings["world"])
+        ] = unit_statistics(
+            df["log_likelihood"].values,
+            df["goal_surprisal"].values,
+            df["action_surprisal"].values,
+            df["reaction_time"].values,
+        )
+    cis = {}
+    if num_resamples > 0:
+        cis = get_bootstrap_cis(units_by_key, num_resamples, seed, executor)
+    rows = []
+    for key in sorted(groups, key=str):
+        log_likelihood_sum, count, goal_correlation, action_correlation = groups[key]
+        row = dict(zip(groupby, key))
+        row["avg_log_likelihood"] = log_likelihood_sum / count
+        row["goal_correlation_r"], row["goal_correlation_p"] = goal_correlation.result()
+        (
+            row["action_correlation_r"],
+            row["action_correlation_p"],
+        ) = action_correlation.result()
+        row.update(cis.get(key, {}))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+class Plotter:
+    # renders figures, in a process pool if given one, and skips figures
+    # whose file exists and whose data is unchanged since it was drawn
+    def __init__(self, output_folder, executor=None):
+        self.hashes_file = pathlib.Path(output_folder) / "plot_hashes.json"
+        self.hashes = {}
+        if self.hashes_file.exists():
+            with open(self.hashes_file) as f:
+                self.hashes = json.load(f)
+        self.executor = executor
+        self.pending = []
+
+    @staticmethod
+    def data_hash(plot, args):
+        def encode(obj):
+            if isinstance(obj, (pd.DataFrame, pd.Series)):
+                return obj.to_json()
+            if isinstance(obj, np.ndarray):
+                return hashlib.sha256(np.ascontiguousarray(obj).tobytes()).hexdigest()
+            return str(obj)
+
+        data = json.dumps([plot.__name__, args], default=encode)
+        return hashlib.sha256(data.encode()).hexdigest()[:16]
+
+    def submit(self, plot, path, *args):
+        # plot(path, *args) must be a module-level function so it can be pickled
+        digest = self.data_hash(plot, args)
+        if path.exists() and self.hashes.get(path.name) == digest:
+            return
+        if self.executor is None:
+            plot(path, *args)
+            self.hashes[path.name] = digest
+        else:
+            self.pending.append(
+                (path.name, digest, self.executor.submit(plot, path, *args))
+            )
+
+    def close(self):
+        for name, digest, future in self.pending:
+            future.result()
+            self.hashes[name] = digest
+        self.pending = []
+        with open(self.hashes_file, "w") as f:
+            json.dump(self.hashes, f, indent=1)
+
+
+def make_heatmaps(output_folder, summary, groupby, metric_cols, plotter=None):
     assert len(groupby) == 2
     assert groupby[0] != "dummy"
     summary["dummy"] = 1
     g = summary.groupby(groupby)
-    plt.rc("text", usetex=True)
+    own_plotter = plotter is None
+    if own_plotter:
+        plotter = Plotter(output_folder)
     for col in metric_cols:
         m = g[col].mean().unstack(level=0)
-        if groupby[1] == "dummy":
-            plt.figure(figsize=(16, 1))
-        else:
-            plt.figure(figsize=(16, 4))
-        sns.heatmap(m, annot=True)
-        if groupby[0] == "update_criteria":
-            for y in [5, 10]:
-                plt.axvline(y, color="white", linewidth=5.0)
-            plt.gca().set_xticklabels(
-                [
-                    format_update(tick_label.get_text())
-                    for tick_label in plt.gca().get_xticklabels()
-                ]
-            )
-        plt.title(format_col(col))
-        plt.xlabel(format_col(groupby[0]))
-        plt.ylabel(format_col(groupby[1]) if groupby[1] != "dummy" else None)
-        if groupby[1] == "dummy":
-            plt.yticks([])
-        else:
-            plt.yticks(rotation=0)
-        plt.savefig(
-            output_folder / f"{'-'.join([col] + groupby)}.pdf", bbox_inches="tight"
+        plotter.submit(
+            plot_heatmap,
+            output_folder / f"{'-'.join([col] + groupby)}.pdf",
+            m,
+            groupby,
+            col,
         )
-        plt.close()
+    if own_plotter:
+        plotter.close()
 
 
-def make_belief_plots(output_folder, model_data):
-    plt.style.use("ggplot")
+def plot_heatmap(path, m, groupby, col):
     plt.rc("text", usetex=True)
-    belief_data = model_data.groupby(
-        ["world", "update_criteria", "alpha"], as_index=False
-    )["beliefs"].apply(list)
-    for world in belief_data["world"].unique():
-        world_data = belief_data[belief_data["world"] == world]
-        for (update_criteria, alpha), beliefs in world_data.groupby(
-            ["update_criteria", "alpha"]
-        )["beliefs"]:
-            goals = list(beliefs.iloc[0][0].keys())
-            goal_data = [[b[g] for b in beliefs.iloc[0]] for g in goals]
-            plt.figure(figsize=(3, 1.35))
-            for g, g_data in zip(goals, goal_data):
-                plt.plot(
-                    g_data, color=(np.array(Game.key_colors(g)) / 255), linewidth=3
-                )
-            plt.ylim((0, 1))
-            plt.xticks([])
-            plt.yticks([])
-            plt.savefig(
-                output_folder / f"{world}-{update_criteria}-{alpha}.pdf",
-                bbox_inches="tight",
-                pad_inches=0,
+    if groupby[1] == "dummy":
+        plt.figure(figsize=(16, 1))
+    else:
+        plt.figure(figsize=(16, 4))
+    sns.heatmap(m, annot=True)
+    if groupby[0] == "update_criteria":
+        for y in [5, 10]:
+            plt.axvline(y, color="white", linewidth=5.0)
+        plt.gca().set_xticklabels(
+            [
+                format_update(tick_label.get_text())
+                for tick_label in plt.gca().get_xticklabels()
+            ]
+        )
+    plt.title(format_col(col))
+    plt.xlabel(format_col(groupby[0]))
+    plt.ylabel(format_col(groupby[1]) if groupby[1] != "dummy" else None)
+    if groupby[1] == "dummy":
+        plt.yticks([])
+    else:
+        plt.yticks(rotation=0)
+    plt.savefig(path, bbox_inches="tight")
+    plt.close()
+
+
+def iter_belief_trajectories(model_folder):
+    # (world, update_criteria, alpha, goals, turns x goals beliefs) per run
+    model_folder = pathlib.Path(model_folder)
+    store = BeliefStore(model_folder)
+    for file in sorted(model_folder.glob("*.csv")):
+        settings = get_file_settings(file, "model")
+        trajectory = store.get(file.stem)
+        if trajectory is None:
+            beliefs = pd.read_csv(file, usecols=["beliefs"])["beliefs"]
+            trajectory = beliefs_to_array(list(beliefs.apply(eval)))
+        yield (
+            settings["world"],
+            settings["update_criteria"],
+            settings["alpha"],
+            *trajectory,
+        )
+
+
+def make_belief_plots(output_folder, model_folder, plotter=None, combined=False):
+    if combined:
+        plot_belief_grids(
+            output_folder / "belief_plots.pdf",
+            list(iter_belief_trajectories(model_folder)),
+        )
+        return
+    own_plotter = plotter is None
+    if own_plotter:
+        plotter = Plotter(output_folder)
+    for world, update_criteria, alpha, goals, beliefs in iter_belief_trajectories(
+        model_folder
+    ):
+        plotter.submit(
+            plot_beliefs,
+            output_folder / f"{world}-{update_criteria}-{alpha}.pdf",
+            goals,
+            beliefs,
+        )
+    if own_plotter:
+        plotter.close()
+
+
+def draw_beliefs(ax, goals, beliefs):
+    for i, g in enumerate(goals):
+        ax.plot(beliefs[:, i], color=(np.array(Game.key_colors(g)) / 255), linewidth=3)
+    ax.set_ylim((0, 1))
+    ax.set_xticks([])
+    ax.set_yticks([])
+
+
+def plot_beliefs(path, goals, beliefs):
+    with plt.style.context("ggplot"):
+        plt.rc("text", usetex=True)
+        plt.figure(figsize=(3, 1.35))
+        draw_beliefs(plt.gca(), goals, beliefs)
+        plt.savefig(path, bbox_inches="tight", pad_inches=0)
+        plt.close()
+
+
+def plot_belief_grids(path, records):
+    # one page per world, with update criteria down and alphas across
+    worlds = sorted(set(r[0] for r in records))
+    with plt.style.context("ggplot"), PdfPages(path) as pdf:
+        plt.rc("text", usetex=True)
+        for world in worlds:
+            world_records = [r for r in records if r[0] == world]
+            criteria = sorted(set(r[1] for r in world_records), key=str)
+            alphas = sorted(set(r[2] for r in world_records))
+            fig, axes = plt.subplots(
+                len(criteria),
+                len(alphas),
+                figsize=(3 * len(alphas), 1.35 * len(criteria)),
+                squeeze=False,
             )
-            plt.close()
+            for _, update_criteria, alpha, goals, beliefs in world_records:
+                ax = axes[criteria.index(update_criteria)][alphas.index(alpha)]
+                draw_beliefs(ax, goals, beliefs)
+            for ax, alpha in zip(axes[0], alphas):
+                ax.set_title(format_alpha(alpha))
+            for ax, update_criteria in zip(axes[:, 0], criteria):
+                ax.set_ylabel(format_update(update_criteria))
+            fig.suptitle(f"World {world}")
+            pdf.savefig(fig, bbox_inches="tight")
+            plt.close(fig)
 
 
 def analyze_data(
-    record_game_folder=None, run_model_folder=None, replay_data_folder=None
+    record_game_folder=None,
+    run_model_folder=None,
+    replay_data_folder=None,
+    streaming=False,
+    plot_workers=0,
+    combined_belief_plots=False,
+    bootstrap_resamples=0,
+    seed=0,
 ):
+    # streaming reads one file at a time and keeps only group-level statistics
+    check_manifests(
+        *[pathlib.Path(f) for f in [run_model_folder, replay_data_folder] if f]
+    )
+    executor = ProcessPoolExecutor(plot_workers) if plot_workers > 0 else None
     if record_game_folder:
-        data = extract_data(record_game_folder, mode="human")
-        performance_summary = get_performance(
-            data, groupby=["world"], avg_over=["subj"]
-        )
+        if streaming:
+            performance_summary = stream_performance(
+                record_game_folder, mode="human", groupby=["world"]
+            )
+        else:
+            data = extract_data(record_game_folder, mode="human")
+            performance_summary = get_performance(
+                data,
+                get_door_cells(record_game_folder),
+                groupby=["world"],
+                avg_over=["subj"],
+            )
         output_folder = pathlib.Path(record_game_folder + "_outputs")
         output_folder.mkdir(parents=True, exist_ok=True)
+        plotter = Plotter(output_folder, executor)
         make_heatmaps(
             output_folder,
             performance_summary,
             groupby=["world", "dummy"],
             metric_cols=["speed_ratio", "speed_diff", "solved"],
+            plotter=plotter,
         )
+        plotter.close()
 
     if run_model_folder:
-        data = extract_data(run_model_folder, mode="model")
-        performance_summary = get_performance(
-            data, groupby=["world", "alpha", "update_criteria"]
-        )
         output_folder = pathlib.Path(run_model_folder + "_outputs")
         belief_plot_folder = output_folder / "belief_plots"
         belief_plot_folder.mkdir(parents=True, exist_ok=True)
+        plotter = Plotter(output_folder, executor)
+        belief_plotter = Plotter(belief_plot_folder, executor)
+        if streaming:
+            performance_summary = stream_performance(
+                run_model_folder,
+                mode="model",
+                groupby=["world", "alpha", "update_criteria"],
+            )
+        else:
+            data = extract_data(run_model_folder, mode="model")
+            performance_summary = get_performance(
+                data,
+                get_door_cells(run_model_folder),
+                groupby=["world", "alpha", "update_criteria"],
+            )
+        make_belief_plots(
+            belief_plot_folder,
+            run_model_folder,
+            plotter=belief_plotter,
+            combined=combined_belief_plots,
+        )
         make_heatmaps(
             output_folder,
             performance_summary,
             groupby=["update_criteria", "alpha"],
             metric_cols=["speed_ratio", "speed_diff", "solved"],
+            plotter=plotter,
         )
         make_heatmaps(
             output_folder,
             performance_summary,
             groupby=["world", "dummy"],
             metric_cols=["speed_ratio", "speed_diff", "solved"],
+            plotter=plotter,
         )
-        make_belief_plots(belief_plot_folder, data)
+        belief_plotter.close()
+        plotter.close()
 
     if replay_data_folder:
-        data = extract_data(replay_data_folder, mode="replay")
-        comparison_summary = get_comparison(
-            data, groupby=["alpha", "update_criteria"], avg_over=["subj", "world"]
-        )
+        if streaming:
+            comparison_summary = stream_comparison(
+                replay_data_folder,
+                groupby=["alpha", "update_criteria"],
+                num_resamples=bootstrap_resamples,
+                seed=seed,
+                executor=executor,
+            )
+        else:
+            data = extract_data(replay_data_folder, mode="replay")
+            comparison_summary = get_comparison(
+                data,
+                groupby=["alpha", "update_criteria"],
+                avg_over=["subj", "world"],
+                num_resamples=bootstrap_resamples,
+                seed=seed,
+                executor=executor,
+            )
         output_folder = pathlib.Path(replay_data_folder + "_outputs")
         output_folder.mkdir(parents=True, exist_ok=True)
+        # every setting's values, with bootstrap intervals over recordings if asked for
+        comparison_summary.to_csv(output_folder / "comparison_summary.csv", index=False)
+        plotter = Plotter(output_folder, executor)
         make_heatmaps(
             output_folder,
             comparison_summary,
@@ -271,4 +717,8 @@ def analyze_data(
                 "goal_correlation_p",
                 "action_correlation_p",
             ],
+            plotter=plotter,
         )
+        plotter.close()
+    if executor is not None:
+        executor.shutdown()
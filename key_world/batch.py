@@ -0,0 +1,431 @@
+import typing
+import copy
+import weakref
+import numpy as np
+import pandas as pd  # type: ignore[import-untyped]
+from key_world.world import World, Pos
+from key_world.agents import Agent, Knower
+from key_world.algs_knower import Node, make_get_neighbors, get_moves
+from key_world.algs_watcher import KnowerDistances, SearchBudget, init_beliefs
+from key_world.rooms import RoomGraph
+
+# update criteria kinds as array codes
+CRITERIA = {"turn": 0, "action": 1, "goal": 2}
+# four neighbors and staying put
+MAX_OPTIONS = 5
+# the Game stops after this many turns of both agents together
+MAX_TURNS = 200
+
+
+class DistanceTable:
+    # Path lengths to the main door from an agent's next positions, for each
+    # goal, memoized by the agent's position and key and the world's keys and
+    # doors (see World.fingerprint). Games on the same world share a table
+    # whatever their settings, since they keep reaching the same states, and
+    # searches in the same state share a room graph, built on a copy of the
+    # world that stays in that state.
+    def __init__(self) -> None:
+        self.entries: typing.Dict[
+            typing.Tuple, typing.Tuple[typing.List[Pos], typing.Dict[int, np.ndarray]]
+        ] = {}
+        self.fingerprints: "weakref.WeakKeyDictionary[World, typing.Dict[int, typing.Tuple]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self.room_graphs: typing.Dict[typing.Tuple, RoomGraph] = {}
+
+    def get_fingerprint(self, world: World) -> typing.Tuple:
+        fingerprints = self.fingerprints.setdefault(world, {})
+        if world.version not in fingerprints:
+            fingerprints[world.version] = world.fingerprint()
+        return fingerprints[world.version]
+
+    def get(
+        self,
+        world: World,
+        agent,
+        goals: typing.List[int],
+        goal_pos: Pos,
+        key_agnostic: bool,
+    ) -> typing.Tuple[typing.List[Pos], np.ndarray]:
+        # the agent's options in the order the Watcher's searches list them,
+        # and a goals x options array of lengths, see choose_move_given_beliefs
+        # and get_knower_path_lengths
+        key_id = agent.key.identifier if agent.key else None
+        fingerprint = self.get_fingerprint(world)
+        state = (key_agnostic, agent.pos, key_id, fingerprint)
+        entry = self.entries.get(state)
+        missing = goals if entry is None else [g for g in goals if g not in entry[1]]
+        if missing:
+            start_node = Node(pos=agent.pos, key_id=key_id)
+            stay_node = copy.deepcopy(start_node)
+            stay_node.parent = start_node
+            get_neighbors = make_get_neighbors(world, key_agnostic)
+            next_nodes = get_neighbors(start_node) + [stay_node]
+            if entry is None:
+                entry = ([node.pos for node in next_nodes], {})
+                self.entries[state] = entry
+            if fingerprint not in self.room_graphs:
+                self.room_graphs[fingerprint] = RoomGraph(
+                    World.from_dict(world.to_dict(), validate=False)
+                )
+            room_graph = self.room_graphs[fingerprint]
+            goal_nodes = [Node(pos=goal_pos, key_id=goal) for goal in missing]
+            found = np.array(
+                [
+                    room_graph.find_path_lengths(node, goal_nodes, key_agnostic)
+                    for node in next_nodes
+                ]
+            ).reshape(len(next_nodes), len(missing))
+            for goal, goal_lengths in zip(missing, found.T):
+                entry[1][goal] = goal_lengths
+        assert entry is not None
+        options, lengths = entry
+        return options, np.array([lengths[goal] for goal in goals]).reshape(
+            len(goals), len(options)
+        )
+
+    def knower_lengths(
+        self, world: World, knower, goals: typing.List[int]
+    ) -> typing.Tuple[typing.List[Pos], np.ndarray]:
+        goal_pos = Pos((world.maindoor.pos[0], world.maindoor.pos[1] - 1))
+        return self.get(world, knower, goals, goal_pos, key_agnostic=True)
+
+    def watcher_lengths(
+        self, world: World, watcher, goals: typing.List[int]
+    ) -> typing.Tuple[typing.List[Pos], np.ndarray]:
+        return self.get(world, watcher, goals, world.maindoor.pos, key_agnostic=False)
+
+
+class TableDistances(KnowerDistances):
+    # KnowerDistances answered from a world's DistanceTable
+    def __init__(self, world: World, table: DistanceTable) -> None:
+        super().__init__(world)
+        self.table = table
+
+    def get_many(
+        self,
+        knower,
+        goal_key_ids: typing.Iterable[int],
+        budget: typing.Optional[SearchBudget] = None,
+    ) -> typing.Dict[int, typing.Dict[Pos, int]]:
+        assert budget is None
+        goals = list(goal_key_ids)
+        options, lengths = self.table.knower_lengths(self.world, knower, goals)
+        return {
+            goal: dict(zip(options, goal_lengths.tolist()))
+            for goal, goal_lengths in zip(goals, lengths)
+        }
+
+
+class BatchWatcher(Agent):
+    # moves where the batch tells it to
+    def __init__(self, pos: Pos, world: World) -> None:
+        super().__init__(pos, world)
+        self.next_pos = pos
+
+    def choose_move(self) -> Pos:
+        return self.next_pos
+
+
+def p_next_given_goals(
+    lengths: np.ndarray, mask: np.ndarray, alpha: np.ndarray
+) -> np.ndarray:
+    # get_p_next_given_goal_from_lengths for games x goals x options arrays,
+    # zero where mask is not set
+    lengths = np.where(mask, lengths, 0)
+    total = lengths.sum(axis=2, keepdims=True)
+    total[total == 0] = 1
+    p = np.where(mask, np.power(1 - lengths / total, alpha[:, None, None]), 0)
+    denom = p.sum(axis=2, keepdims=True)
+    assert (denom[mask.any(axis=2)] > 0).all()
+    denom[denom == 0] = 1
+    return p / denom
+
+
+def sum_goals(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    # sum over the goals axis of games x goals (x ...) values, only where mask
+    # is set, one goal at a time in the order of each game's beliefs, as the
+    # Watcher's sums over its dicts go; numpy's own sums group terms by the
+    # padded width, which would make the last bits depend on the batch
+    total = np.zeros(values.shape[:1] + values.shape[2:])
+    for j in np.flatnonzero(mask.any(axis=0)):
+        column_mask = mask[:, j].reshape((-1,) + (1,) * (values.ndim - 2))
+        total += np.where(column_mask, values[:, j], 0)
+    return total
+
+
+def confirm_normalized(probs: np.ndarray) -> None:
+    totals = probs.sum(axis=-1)
+    assert np.allclose(totals, 1, atol=1e-4), f"sums={totals}"
+
+
+def prune_belief_arrays(
+    beliefs: np.ndarray, goal_mask: np.ndarray, belief_epsilon: float
+) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # prune_beliefs for a games x goals array: the pruned beliefs, which goals
+    # were kept and the mass dropped per game
+    if belief_epsilon <= 0:
+        return beliefs, goal_mask, np.zeros(len(beliefs))
+    best = np.argmax(np.where(goal_mask, beliefs, -1), axis=1)
+    kept = goal_mask & (
+        (beliefs >= belief_epsilon) | (np.arange(beliefs.shape[1]) == best[:, None])
+    )
+    dropped = goal_mask & ~kept
+    pruned_mass = sum_goals(beliefs, dropped)
+    total = sum_goals(beliefs, kept)[:, None]
+    pruned = np.where(
+        dropped.any(axis=1, keepdims=True),
+        np.where(kept, beliefs / total, 0),
+        beliefs,
+    )
+    return pruned, kept, pruned_mass
+
+
+class GameBatch:
+    # Plays many model games in lockstep, on any mix of worlds and settings,
+    # with the same moves, beliefs and logs as a Game for each. Every game
+    # keeps its own copy of the world, whose keys and doors change as the
+    # agents move, but agent positions and keys, beliefs, predictions and
+    # update criteria live in games x ... arrays, so each turn's belief
+    # updates, predictions and move choices are a few array operations over
+    # all games at once. Path lengths come from one DistanceTable per world.
+    # Planning, search budgets and particles are left to Game.
+    def __init__(
+        self,
+        worlds: typing.List[World],
+        settings: typing.List[typing.Tuple[int, float, typing.Tuple[str, float]]],
+        belief_epsilon: float = 0.0,
+        distance_prior: bool = False,
+    ) -> None:
+        # settings are (world index, alpha, update criteria), one per game
+        self.belief_epsilon = belief_epsilon
+        self.tables: typing.Dict[int, DistanceTable] = {}
+        moves: typing.Dict[int, typing.List[Pos]] = {}
+        # a fresh world for every game, rebuilt faster than it deep copies
+        world_dicts: typing.Dict[int, typing.Dict[str, typing.Any]] = {}
+        self.worlds: typing.List[World] = []
+        self.knowers: typing.List[Knower] = []
+        self.watchers: typing.List[BatchWatcher] = []
+        initial_beliefs = []
+        for idx, alpha, _ in settings:
+            if idx not in self.tables:
+                self.tables[idx] = DistanceTable()
+                moves[idx] = get_moves(worlds[idx])
+                world_dicts[idx] = worlds[idx].to_dict()
+            world = World.from_dict(world_dicts[idx], validate=False)
+            knower = Knower(
+                world.knower_start, world, world.maindoor.key_id, list(moves[idx])
+            )
+            self.worlds.append(world)
+            self.knowers.append(knower)
+            self.watchers.append(BatchWatcher(world.watcher_start, world))
+            initial_beliefs.append(
+                init_beliefs(
+                    world,
+                    knower,
+                    alpha,
+                    TableDistances(world, self.tables[idx]),
+                    distance_prior,
+                )
+            )
+        num_games = len(settings)
+        num_goals = max(len(beliefs) for beliefs in initial_beliefs)
+        self.world_idxs = [idx for idx, _, _ in settings]
+        self.alphas = np.array([alpha for _, alpha, _ in settings], dtype=float)
+        self.criteria = np.array([CRITERIA[kind] for _, _, (kind, _) in settings])
+        self.thresholds = np.array(
+            [value for _, _, (_, value) in settings], dtype=float
+        )
+        # goals in the order of each game's beliefs, padded with -1
+        self.goals = np.full((num_games, num_goals), -1)
+        self.beliefs = np.zeros((num_games, num_goals))
+        for i, beliefs in enumerate(initial_beliefs):
+            self.goals[i, : len(beliefs)] = list(beliefs)
+            self.beliefs[i, : len(beliefs)] = list(beliefs.values())
+        self.goal_mask = self.goals >= 0
+        self.watcher_pos = np.array([w.pos for w in self.watchers]).reshape(-1, 2)
+        self.knower_pos = np.array([k.pos for k in self.knowers]).reshape(-1, 2)
+        # held key ids, 0 for none
+        self.watcher_keys = np.zeros(num_games, dtype=int)
+        self.knower_keys = np.zeros(num_games, dtype=int)
+        self.maindoor_pos = np.array([w.maindoor.pos for w in self.worlds]).reshape(
+            -1, 2
+        )
+        self.maindoor_keys = np.array([w.maindoor.key_id for w in self.worlds])
+        self.num_moves = np.zeros(num_games, dtype=int)
+        self.active = np.ones(num_games, dtype=bool)
+        # the last predictions of the Knower's move: its options, the
+        # probability of each and of each given every goal kept for them,
+        # and, once it moved, which option it took
+        self.has_predictions = np.zeros(num_games, dtype=bool)
+        self.knower_options: typing.List[typing.List[Pos]] = [[] for _ in settings]
+        self.p_action = np.zeros((num_games, MAX_OPTIONS))
+        self.p_action_given_goal = np.zeros((num_games, num_goals, MAX_OPTIONS))
+        self.predicted = np.zeros((num_games, num_goals), dtype=bool)
+        self.knower_choice = np.zeros(num_games, dtype=int)
+        self.approximation_error = np.zeros(num_games)
+        # what a recording Game logs after every Knower move
+        self.logs: typing.List[typing.List[typing.Dict[str, typing.Any]]] = [
+            [] for _ in settings
+        ]
+        self.belief_history: typing.List[typing.List[np.ndarray]] = [
+            [] for _ in settings
+        ]
+
+    def gather_lengths(
+        self,
+        idxs: np.ndarray,
+        kept: np.ndarray,
+        knower: bool,
+    ) -> typing.Tuple[typing.List[typing.List[Pos]], np.ndarray, np.ndarray]:
+        # each game's options for the Knower or the Watcher, and games x goals
+        # x options lengths of the kept goals, padded with ones
+        lengths = np.ones((len(idxs), self.goals.shape[1], MAX_OPTIONS))
+        option_mask = np.zeros((len(idxs), MAX_OPTIONS), dtype=bool)
+        all_options = []
+        for row, i in enumerate(idxs):
+            goals = self.goals[i, kept[row]].tolist()
+            table = self.tables[self.world_idxs[i]]
+            if knower:
+                options, game_lengths = table.knower_lengths(
+                    self.worlds[i], self.knowers[i], goals
+                )
+            else:
+                options, game_lengths = table.watcher_lengths(
+                    self.worlds[i], self.watchers[i], goals
+                )
+            goal_rows = np.flatnonzero(kept[row])
+            lengths[row, goal_rows, : len(options)] = game_lengths
+            option_mask[row, : len(options)] = True
+            all_options.append(options)
+        return all_options, lengths, option_mask
+
+    def should_update(self, idxs: np.ndarray) -> np.ndarray:
+        # Watcher.should_update for the given games
+        has_predictions = self.has_predictions[idxs]
+        choice = self.knower_choice[idxs]
+        p_action = self.p_action[idxs, choice]
+        best = np.argmax(np.where(self.goal_mask[idxs], self.beliefs[idxs], -1), axis=1)
+        p_best_goal = self.p_action_given_goal[idxs, best, choice]
+        criteria = self.criteria[idxs]
+        thresholds = self.thresholds[idxs]
+        by_turn = (criteria == CRITERIA["turn"]) & (
+            self.num_moves[idxs] % thresholds == 0
+        )
+        by_action = (criteria == CRITERIA["action"]) & (p_action < thresholds)
+        by_goal = (criteria == CRITERIA["goal"]) & (p_best_goal < thresholds)
+        return has_predictions & (by_turn | by_action | by_goal)
+
+    def update_beliefs(self, idxs: np.ndarray) -> None:
+        # update_beliefs for the given games
+        choice = self.knower_choice[idxs]
+        beliefs = self.beliefs[idxs]
+        predicted = self.predicted[idxs]
+        p_action = self.p_action[idxs, choice][:, None]
+        p_given_goal = np.take_along_axis(
+            self.p_action_given_goal[idxs], choice[:, None, None], axis=2
+        )[:, :, 0]
+        live_mass = np.where(
+            (self.goal_mask[idxs] & ~predicted).any(axis=1),
+            sum_goals(beliefs, predicted),
+            1.0,
+        )[:, None]
+        new_beliefs = np.where(
+            predicted, p_given_goal * beliefs / live_mass / p_action, 0
+        )
+        confirm_normalized(new_beliefs)
+        self.beliefs[idxs] = new_beliefs
+
+    def watcher_turn(self) -> None:
+        # Watcher.deliberate and move for every active game
+        idxs = np.flatnonzero(self.active)
+        updating = idxs[self.should_update(idxs)]
+        if len(updating):
+            self.update_beliefs(updating)
+        beliefs, kept, pruned_mass = prune_belief_arrays(
+            self.beliefs[idxs], self.goal_mask[idxs], self.belief_epsilon
+        )
+        alphas = self.alphas[idxs]
+        options, lengths, option_mask = self.gather_lengths(idxs, kept, knower=False)
+        move_mask = kept[:, :, None] & option_mask[:, None, :]
+        p_moves = p_next_given_goals(lengths, move_mask, alphas)
+        move_dist = sum_goals(p_moves * beliefs[:, :, None], kept)
+        confirm_normalized(move_dist)
+        # the first of equally likely moves, as max over the Watcher's dict
+        choices = np.argmax(np.where(option_mask, move_dist, -1), axis=1)
+        # predictions of the Knower's next move, before the Watcher moves
+        knower_options, knower_lengths, knower_mask = self.gather_lengths(
+            idxs, kept, knower=True
+        )
+        predict_mask = kept[:, :, None] & knower_mask[:, None, :]
+        p_action_given_goal = p_next_given_goals(knower_lengths, predict_mask, alphas)
+        p_action = sum_goals(p_action_given_goal * beliefs[:, :, None], kept)
+        confirm_normalized(p_action)
+        self.p_action[idxs] = p_action
+        self.p_action_given_goal[idxs] = p_action_given_goal
+        self.predicted[idxs] = kept
+        self.has_predictions[idxs] = True
+        for row, i in enumerate(idxs):
+            self.knower_options[i] = knower_options[row]
+            watcher = self.watchers[i]
+            watcher.next_pos = options[row][choices[row]]
+            watcher.move()
+            self.watcher_pos[i] = watcher.pos
+            self.watcher_keys[i] = watcher.key.identifier if watcher.key else 0
+        self.approximation_error[idxs] = pruned_mass
+        self.num_moves[idxs] += 1
+
+    def knower_turn(self) -> None:
+        # the Knower's move and what Game.play_turns does after it
+        idxs = np.flatnonzero(self.active)
+        for i in idxs:
+            knower = self.knowers[i]
+            knower.move()
+            self.knower_pos[i] = knower.pos
+            self.knower_keys[i] = knower.key.identifier if knower.key else 0
+            self.knower_choice[i] = self.knower_options[i].index(knower.pos)
+            log = {"watcher_pos": self.watchers[i].pos, "knower_pos": knower.pos}
+            if self.belief_epsilon > 0:
+                log["approximation_error"] = self.approximation_error[i]
+            self.logs[i].append(log)
+            self.belief_history[i].append(self.beliefs[i, self.goal_mask[i]])
+        opened = idxs[
+            self.at_main_door(self.watcher_pos, self.watcher_keys)[idxs]
+            & self.at_main_door(self.knower_pos, self.knower_keys)[idxs]
+        ]
+        for i in opened:
+            self.worlds[i].maindoor.is_open = True
+        self.active[opened] = False
+
+    def at_main_door(self, pos: np.ndarray, keys: np.ndarray) -> np.ndarray:
+        # World.at_main_door for every game
+        x, y = self.maindoor_pos.T
+        return (
+            (pos[:, 0] == x)
+            & ((pos[:, 1] == y) | (pos[:, 1] == y - 1))
+            & (keys == self.maindoor_keys)
+        )
+
+    def play(self) -> None:
+        for _ in range(MAX_TURNS // 2):
+            if not self.active.any():
+                break
+            self.watcher_turn()
+            self.knower_turn()
+        # games that did not open the door by then failed
+        self.active[:] = False
+
+    def game_log(self, i: int) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                column: [log[column] for log in self.logs[i]]
+                for column in self.logs[i][0]
+            }
+        )
+
+    def game_beliefs(self, i: int) -> typing.List[typing.Dict[int, float]]:
+        # in the form of Game.belief_history, see save_beliefs
+        goals = self.goals[i, self.goal_mask[i]].tolist()
+        return [
+            dict(zip(goals, beliefs.tolist())) for beliefs in self.belief_history[i]
+        ]
@@ -0,0 +1,111 @@
+import typing
+import json
+import pathlib
+import zipfile
+import numpy as np
+
+PACKED_FILE = "beliefs.npy"
+PACKED_INDEX_FILE = "beliefs_index.json"
+
+
+def beliefs_to_array(
+    beliefs: typing.List[typing.Dict[int, float]]
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    # goals, and a turns x goals trajectory in that goal order
+    goals = np.array(list(beliefs[0].keys()), dtype=np.int64)
+    trajectory = np.array(
+        [[b[g] for g in goals] for b in beliefs], dtype=np.float32
+    ).reshape(len(beliefs), len(goals))
+    return goals, trajectory
+
+
+def save_beliefs(path: pathlib.Path, beliefs: typing.List[typing.Dict[int, float]]):
+    goals, trajectory = beliefs_to_array(beliefs)
+    np.savez(path, goals=goals, beliefs=trajectory)
+
+
+def load_beliefs(path: pathlib.Path) -> typing.Tuple[np.ndarray, np.ndarray]:
+    with np.load(path) as data:
+        return data["goals"], data["beliefs"]
+
+
+def load_beliefs_shape(path: pathlib.Path) -> typing.Tuple[int, int]:
+    # turns and goals of a saved trajectory, from its header alone
+    with zipfile.ZipFile(path) as archive, archive.open("beliefs.npy") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, _, _ = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, _, _ = np.lib.format.read_array_header_2_0(f)
+    num_turns, num_goals = shape
+    return num_turns, num_goals
+
+
+def get_file_stamp(path: pathlib.Path) -> typing.List[int]:
+    # changes whenever the file is written again
+    stat = path.stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def pack_beliefs(folder: pathlib.Path) -> None:
+    # every run's trajectory in one float32 array, padded with nan up to the
+    # largest number of goals, so a whole sweep can be memory mapped at once;
+    # it is sized from the files' headers and filled one run at a time
+    files = sorted(folder.glob("*.npz"))
+    shapes = [load_beliefs_shape(file) for file in files]
+    num_turns = sum(turns for turns, _ in shapes)
+    num_goals = max((goals for _, goals in shapes), default=0)
+    packed = np.lib.format.open_memmap(
+        folder / PACKED_FILE, mode="w+", dtype=np.float32, shape=(num_turns, num_goals)
+    )
+    packed[:] = np.nan
+    index = {}
+    start = 0
+    for file in files:
+        # the stamp is taken first, so a run rewritten while it is copied
+        # counts as newer than the packed one
+        stamp = get_file_stamp(file)
+        goals, trajectory = load_beliefs(file)
+        stop = start + len(trajectory)
+        packed[start:stop, : len(goals)] = trajectory
+        index[file.stem] = {
+            "start": start,
+            "stop": stop,
+            "goals": goals.tolist(),
+            "stamp": stamp,
+        }
+        start = stop
+    packed.flush()
+    with open(folder / PACKED_INDEX_FILE, "w") as f:
+        json.dump(index, f)
+
+
+class BeliefStore:
+    # trajectories of a model data folder by csv stem, from the packed array
+    # when available (zero-copy slices), else from each run's npz file
+    def __init__(self, folder: pathlib.Path) -> None:
+        self.folder = folder
+        self.packed: typing.Optional[np.ndarray] = None
+        self.index: typing.Dict[str, typing.Dict[str, typing.Any]] = {}
+        if (folder / PACKED_INDEX_FILE).exists():
+            self.packed = np.load(folder / PACKED_FILE, mmap_mode="r")
+            with open(folder / PACKED_INDEX_FILE) as f:
+                self.index = json.load(f)
+
+    def get(self, stem: str) -> typing.Optional[typing.Tuple[np.ndarray, np.ndarray]]:
+        path = self.folder / f"{stem}.npz"
+        if (
+            stem in self.index
+            and self.packed is not None
+            # runs redone since packing (or packed before runs were stamped)
+            # are read from their own file
+            and not (
+                path.exists() and get_file_stamp(path) != self.index[stem].get("stamp")
+            )
+        ):
+            entry = self.index[stem]
+            goals = np.array(entry["goals"], dtype=np.int64)
+            return goals, self.packed[entry["start"] : entry["stop"], : len(goals)]
+        if path.exists():
+            return load_beliefs(path)
+        return None
@@ -1,9 +1,12 @@
 import typing
 import tkinter as tk
 import time
+import colorsys
 from PIL import Image, ImageTk  # type: ignore[import-untyped]
 from key_world.world import World, Door, Key, Lookups, Pos, MainDoor
 from key_world.agents import Knower, Watcher
+from key_world.replay import OnlineReplay
+from key_world.beliefs import save_beliefs
 from itertools import product
 import numpy as np
 from enum import Enum
@@ -11,6 +14,9 @@ import pandas as pd  # type: ignore[import-untyped]
 import os
 import pathlib
 import copy
+import queue
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
 
 Updated = Enum("Updated", ["WATCHER", "KNOWER"])
 
@@ -26,12 +32,26 @@ class Game:
         output_folder: str = "./outputs",
         csv_name: str = "log.csv",
         gui: bool = True,
+        belief_epsilon: float = 0.0,
+        distance_prior: bool = False,
+        executor: typing.Optional[Executor] = None,
+        planning_depth: int = 0,
+        planning_budget: int = 1000,
+        search_budget: typing.Optional[float] = None,
+        search_budget_unit: str = "nodes",
+        num_particles: int = 0,
+        resample_threshold: float = 0.5,
+        particle_seed: typing.Any = None,
+        online_settings: typing.List[
+            typing.Tuple[float, typing.Tuple[str, float]]
+        ] = [],
     ) -> None:
         self.BOX_SIZE = 50
         self.WALL_THICKNESS = 10
         self.FLOOR_IMAGE = "key_world/images/floor.png"
         self.KEY_IMAGE = "key_world/images/key.png"
         self.AGENT_IMAGE = "key_world/images/agent.png"
+        self.UI_POLL_MS = 10
         self.gui = gui
         if human_player:
             assert self.gui
@@ -53,7 +73,42 @@ class Game:
             mode="human" if human_player else "model",
             alpha=alpha,
             update_criteria=update_criteria,
+            belief_epsilon=belief_epsilon,
+            distance_prior=distance_prior,
+            executor=executor,
+            planning_depth=planning_depth,
+            planning_budget=planning_budget,
+            search_budget=search_budget,
+            search_budget_unit=search_budget_unit,
+            num_particles=num_particles,
+            resample_threshold=resample_threshold,
+            particle_seed=particle_seed,
         )
+        # model Watchers scored against the human's moves as they are made
+        if online_settings:
+            assert human_player
+        self.online_replays = [
+            OnlineReplay(
+                self.world,
+                self.knower,
+                self.watcher,
+                alpha=online_alpha,
+                update_criteria=online_update_criteria,
+                belief_epsilon=belief_epsilon,
+                distance_prior=distance_prior,
+                search_budget=search_budget,
+                search_budget_unit=search_budget_unit,
+                num_particles=num_particles,
+                resample_threshold=resample_threshold,
+                particle_seed=particle_seed,
+                executor=executor,
+            )
+            for online_alpha, online_update_criteria in online_settings
+        ]
+        self.reaction_times: typing.List[float] = []
+        # model beliefs after every Knower move, saved next to the csv as a
+        # turns x goals array rather than as text in it
+        self.belief_history: typing.List[typing.Dict[int, float]] = []
         if gui:
             self.window = tk.Tk()
             self.window.geometry(
@@ -77,7 +132,12 @@ class Game:
             for x, y in product(range(self.world.shape[0]), range(self.world.shape[1])):
                 self.grid[y][x].grid(row=y, column=x)
 
-            self.key_pressed = tk.StringVar()
+            # the game loop runs on a worker thread and talks to the Tk thread
+            # through these queues, see play
+            self.frames: queue.Queue = queue.Queue()
+            self.key_presses: queue.Queue = queue.Queue()
+            self.frame_time = 0.0
+            self.key_time = 0.0
             self.window.bind("<KeyPress>", self.on_key_press)
 
     def log_step(self, log_dict):
@@ -95,13 +155,46 @@ class Game:
             pd.DataFrame.from_dict(log_dict).to_csv(path, index=False)
 
     def on_key_press(self, event):
-        self.key_pressed.set(event.char)
+        self.key_presses.put((event.char, time.time()))
 
     def wait_for_key_press(self):
-        self.key_pressed.set("")
-        self.window.wait_variable(self.key_pressed)
-        pressed_key = self.key_pressed.get()
-        return pressed_key
+        while True:
+            pressed_key, key_time = self.key_presses.get()
+            # ignore keys pressed before the current frame was on screen
+            if key_time >= self.frame_time:
+                self.key_time = key_time
+                # the move is about to change the world the background turns read
+                for online_replay in self.online_replays:
+                    online_replay.wait()
+                return pressed_key
+
+    def show(
+        self,
+        update_positions: typing.List[Pos] = [],
+        last_updated: typing.Optional[Updated] = None,
+    ) -> None:
+        # called from the game loop; blocks until the Tk thread has drawn the frame
+        if not self.gui:
+            return
+        drawn = threading.Event()
+        self.frames.put((update_positions, last_updated, drawn))
+        drawn.wait()
+
+    def draw_frames(self) -> None:
+        while True:
+            try:
+                frame = self.frames.get_nowait()
+            except queue.Empty:
+                break
+            if frame is None:
+                self.window.destroy()
+                return
+            update_positions, last_updated, drawn = frame
+            self.update_images(update_positions, last_updated)
+            self.window.update_idletasks()
+            self.frame_time = time.time()
+            drawn.set()
+        self.window.after(self.UI_POLL_MS, self.draw_frames)
 
     @staticmethod
     def key_colors(key_id: int) -> typing.Tuple[int, int, int]:
@@ -114,8 +207,14 @@ class Game:
             (242, 227, 19),
             (6, 68, 191),
         ]
-        assert 1 <= key_id <= len(colors)
-        return colors[key_id - 1]
+        assert key_id >= 1
+        if key_id <= len(colors):
+            return colors[key_id - 1]
+        # generated suites can have more key ids; those go round the hues in
+        # golden ratio steps, which keeps any few of them apart
+        hue = (key_id - len(colors)) * 0.618034 % 1.0
+        r, g, b = colorsys.hsv_to_rgb(hue, 0.9, 0.9)
+        return (round(r * 255), round(g * 255), round(b * 255))
 
     def update_images(
         self,
@@ -177,21 +276,52 @@ class Game:
             self.grid[y][x].image = image  # type: ignore[attr-defined]
 
     def play(self):
+        if not self.gui:
+            self.play_turns()
+            return
+        # the Tk thread only draws frames and collects key presses, so the UI
+        # stays responsive while the game loop waits for input or runs inference
+        errors: typing.List[BaseException] = []
+
+        def run_game_loop():
+            try:
+                self.play_turns()
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                self.frames.put(None)
+
+        game_thread = threading.Thread(target=run_game_loop, daemon=True)
+        self.window.after(0, self.draw_frames)
+        game_thread.start()
+        self.window.mainloop()
+        if errors:
+            raise errors[0]
+
+    def play_turns(self):
+        # one worker, so the background turns never compete with each other
+        background = ThreadPoolExecutor(max_workers=1) if self.online_replays else None
         turn = 0
-        if self.gui:
-            self.update_images()
-            self.window.update_idletasks()
-            self.window.update()
+        self.show()
 
         while not self.world.maindoor.is_open:
             turn += 1
             if turn % 2:
                 old_pos = self.watcher.pos
+                for online_replay in self.online_replays:
+                    online_replay.start_turn(background)  # type: ignore[arg-type]
                 start_time = time.time()
                 new_pos = self.watcher.move()
                 end_time = time.time()
                 last_updated = Updated.WATCHER
-                reaction_time = end_time - start_time
+                for online_replay in self.online_replays:
+                    online_replay.finish_turn(new_pos)
+                if self.human_player:
+                    # from the frame appearing to the key press that moved the Watcher
+                    reaction_time = self.key_time - self.frame_time
+                    self.reaction_times.append(reaction_time)
+                else:
+                    reaction_time = end_time - start_time
             else:
                 old_pos = self.knower.pos
                 new_pos = self.knower.move()
@@ -204,7 +334,14 @@ class Game:
                     if self.human_player:
                         log_dict["reaction_time"] = [reaction_time]
                     else:
-                        log_dict["beliefs"] = [self.watcher.beliefs]
+                        self.belief_history.append(dict(self.watcher.beliefs))
+                        if self.watcher.belief_epsilon > 0:
+                            log_dict["approximation_error"] = [
+                                self.watcher.approximation_error[-1]
+                            ]
+                        if self.watcher.search_budget:
+                            log_dict["search_nodes"] = [self.watcher.search_nodes[-1]]
+                            log_dict["search_ms"] = [self.watcher.search_ms[-1]]
                     self.log_step(log_dict)
                 # checking after knower moves so both agents always move same number of times
                 if self.world.at_main_door(
@@ -219,9 +356,17 @@ class Game:
                 if turn == 200:
                     # failed to beat game
                     break
-            if self.gui:
-                self.update_images([old_pos, new_pos], last_updated)
-                self.window.update_idletasks()
-                self.window.update()
-        if self.gui:
-            self.window.destroy()
+            self.show([old_pos, new_pos], last_updated)
+        if background:
+            background.shutdown()
+        if self.record and self.belief_history:
+            path = pathlib.Path(self.output_folder) / self.csv_name
+            save_beliefs(path.with_name(path.stem + ".npz"), self.belief_history)
+
+    def online_replay_data(
+        self,
+    ) -> typing.List[typing.Tuple[float, typing.Tuple[str, float], pd.DataFrame]]:
+        return [
+            (r.alpha, r.update_criteria, r.replay_data(self.reaction_times))
+            for r in self.online_replays
+        ]
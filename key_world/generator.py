@@ -0,0 +1,230 @@
+import typing
+import numpy as np
+from key_world.world import World, Wall, Door, MainDoor, Key, Pos, Orientation
+from key_world.algs_knower import Node, get_moves
+from key_world.rooms import RoomGraph
+
+
+def is_solvable(world: World) -> bool:
+    # the Knower needs a real path out, and every search the Watcher may run
+    # (one per potential goal, for both agents) has to succeed as well
+    try:
+        get_moves(world)
+        key_ids = sorted(set(k.identifier for k in world.keys))
+        room_graph = RoomGraph(world)
+        room_graph.find_path_lengths(
+            Node(pos=world.knower_start),
+            [
+                Node(
+                    pos=Pos((world.maindoor.pos[0], world.maindoor.pos[1] - 1)),
+                    key_id=key_id,
+                )
+                for key_id in key_ids
+            ],
+            key_agnostic=True,
+        )
+        room_graph.find_path_lengths(
+            Node(pos=world.watcher_start),
+            [Node(pos=world.maindoor.pos, key_id=key_id) for key_id in key_ids],
+        )
+    except RuntimeError:
+        return False
+    return True
+
+
+def box_barriers(
+    shape: typing.Tuple[int, int],
+    corner: Pos,
+    size: typing.Tuple[int, int],
+) -> typing.List[Wall]:
+    # walls enclosing the cells [x0, x0 + w) x [y0, y0 + h), skipping grid edges
+    (x0, y0), (w, h) = corner, size
+    walls = []
+    for x in range(x0, x0 + w):
+        if y0 > 0:
+            walls.append(Wall(pos=Pos((x, y0)), orientation=Orientation.HORIZONTAL))
+        if y0 + h < shape[1]:
+            walls.append(Wall(pos=Pos((x, y0 + h)), orientation=Orientation.HORIZONTAL))
+    for y in range(y0, y0 + h):
+        if x0 > 0:
+            walls.append(Wall(pos=Pos((x0, y)), orientation=Orientation.VERTICAL))
+        if x0 + w < shape[0]:
+            walls.append(Wall(pos=Pos((x0 + w, y)), orientation=Orientation.VERTICAL))
+    return walls
+
+
+def sample_world(
+    rng: np.random.Generator,
+    shape: typing.Tuple[int, int],
+    num_key_ids: int,
+    num_doors: int,
+    wall_density: float,
+) -> World:
+    width, height = shape
+    mid = height // 2
+    key_ids = list(range(1, num_key_ids + 1))
+    rng.shuffle(key_ids)
+    maindoor_key_id, door_key_ids = key_ids[0], key_ids[1 : num_doors + 1]
+
+    # dividing wall with the main door, as in the hand-written worlds
+    door_x = int(rng.integers(1, width - 1))
+    maindoor = MainDoor(
+        pos=Pos((door_x, mid)),
+        orientation=Orientation.HORIZONTAL,
+        key_id=maindoor_key_id,
+        is_open=False,
+    )
+    walls = [
+        Wall(pos=Pos((i, mid)), orientation=Orientation.HORIZONTAL)
+        for i in range(width)
+        if i != door_x
+    ]
+    taken: typing.Set[typing.Tuple[Orientation, Pos]] = set(
+        (w.orientation, w.pos) for w in walls
+    )
+    taken.add((maindoor.orientation, maindoor.pos))
+
+    # the Knower lives above the dividing wall and the Watcher below it
+    halves = [(0, mid), (mid, height)]
+    used_cells: typing.Set[Pos] = set()
+
+    def random_cell(half: int) -> Pos:
+        y_lo, y_hi = halves[half]
+        while True:
+            pos = Pos((int(rng.integers(0, width)), int(rng.integers(y_lo, y_hi))))
+            if pos not in used_cells:
+                used_cells.add(pos)
+                return pos
+
+    # each door guards a small room holding one copy of another key
+    doors = []
+    boxed_keys = []
+    for door_key_id in door_key_ids:
+        half = int(rng.integers(0, 2))
+        y_lo, y_hi = halves[half]
+        w = int(rng.integers(2, max(3, width // 5) + 1))
+        h = int(rng.integers(2, max(3, (y_hi - y_lo) // 3) + 1))
+        if w >= width or h >= y_hi - y_lo:
+            continue
+        corner = Pos(
+            (int(rng.integers(0, width - w + 1)), int(rng.integers(y_lo, y_hi - h + 1)))
+        )
+        cells = [
+            Pos((x, y))
+            for x in range(corner[0], corner[0] + w)
+            for y in range(corner[1], corner[1] + h)
+        ]
+        box = [
+            b
+            for b in box_barriers(shape, corner, (w, h))
+            if (b.orientation, b.pos) not in taken
+        ]
+        if not box or any(c in used_cells for c in cells):
+            continue
+        door_wall = box.pop(int(rng.integers(0, len(box))))
+        doors.append(
+            Door(
+                pos=door_wall.pos,
+                orientation=door_wall.orientation,
+                key_id=door_key_id,
+            )
+        )
+        walls += box
+        taken.update((b.orientation, b.pos) for b in box)
+        taken.add((door_wall.orientation, door_wall.pos))
+        boxed = [k for k in key_ids if k != door_key_id]
+        boxed_keys.append((half, boxed[int(rng.integers(0, len(boxed)))], cells))
+        used_cells.update(cells)
+
+    # one copy of every key id on each side of the dividing wall
+    keys = []
+    boxed_copies = set()
+    for half, key_id, cells in boxed_keys:
+        if (half, key_id) in boxed_copies:
+            continue
+        boxed_copies.add((half, key_id))
+        keys.append(Key(pos=cells[int(rng.integers(0, len(cells)))], identifier=key_id))
+    knower_start = random_cell(0)
+    watcher_start = random_cell(1)
+    for half in range(2):
+        for key_id in range(1, num_key_ids + 1):
+            if (half, key_id) not in boxed_copies:
+                keys.append(Key(pos=random_cell(half), identifier=key_id))
+
+    # scatter extra walls over the remaining barrier slots
+    num_walls = int(wall_density * 2 * width * height)
+    for _ in range(num_walls):
+        orientation = (
+            Orientation.HORIZONTAL if rng.random() < 0.5 else Orientation.VERTICAL
+        )
+        pos = Pos((int(rng.integers(0, width)), int(rng.integers(0, height))))
+        other = (
+            Orientation.VERTICAL
+            if orientation is Orientation.HORIZONTAL
+            else Orientation.HORIZONTAL
+        )
+        if (orientation, pos) in taken or any(
+            d.pos == pos and d.orientation is other for d in doors + [maindoor]
+        ):
+            continue
+        walls.append(Wall(pos=pos, orientation=orientation))
+        taken.add((orientation, pos))
+
+    return World(
+        shape=shape,
+        knower_start=knower_start,
+        watcher_start=watcher_start,
+        keys=keys,
+        doors=doors,
+        maindoor=maindoor,
+        walls=walls,
+    )
+
+
+def generate_world(
+    shape: typing.Tuple[int, int],
+    num_key_ids: int = 2,
+    num_doors: int = 0,
+    wall_density: float = 0.05,
+    seed: typing.Optional[int] = None,
+    max_attempts: int = 100,
+) -> World:
+    assert shape[0] >= 3 and shape[1] >= 4, "World is too small"
+    assert num_key_ids >= 1
+    assert 0 <= num_doors < num_key_ids, "Every door needs its own key id"
+    assert 0 <= wall_density < 1
+    rng = np.random.default_rng(seed)
+    for _ in range(max_attempts):
+        try:
+            # World.__init__ runs validate_and_create_lookup
+            world = sample_world(rng, shape, num_key_ids, num_doors, wall_density)
+        except AssertionError:
+            continue
+        if len(world.doors) - 1 == num_doors and is_solvable(world):
+            return world
+    raise RuntimeError(f"Could not generate a solvable world in {max_attempts} tries")
+
+
+def generate_world_suite(
+    sizes: typing.List[int],
+    worlds_per_size: int = 1,
+    num_key_ids: int = 2,
+    num_doors: int = 0,
+    wall_density: float = 0.05,
+    seed: int = 0,
+) -> typing.List[World]:
+    # every world gets its own child seed so a suite is reproducible and any
+    # single world can be regenerated on its own
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes) * worlds_per_size)
+    worlds = []
+    for i, size in enumerate(s for s in sizes for _ in range(worlds_per_size)):
+        worlds.append(
+            generate_world(
+                (size, size),
+                num_key_ids=num_key_ids,
+                num_doors=num_doors,
+                wall_density=wall_density,
+                seed=int(seeds[i].generate_state(1)[0]),
+            )
+        )
+    return worlds
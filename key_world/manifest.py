@@ -0,0 +1,123 @@
+import typing
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import uuid
+from key_world.world import World
+
+MANIFEST_FILE = "manifest.json"
+# one record per finished output of the current sweep, see mark_done
+FINISHED_FOLDER = "finished"
+# the modules that decide what games and replays come out as, including the
+# sweeps in __main__ that set them up and write them; analysis and plotting
+# only read them
+OUTPUT_MODULES = [
+    "__main__",
+    "world",
+    "agents",
+    "algs_knower",
+    "algs_watcher",
+    "rooms",
+    "game",
+    "replay",
+    "batch",
+    "beliefs",
+]
+
+
+def get_code_version() -> str:
+    # the package has no release metadata, so hash the sources that made the outputs
+    digest = hashlib.sha256()
+    for module in OUTPUT_MODULES:
+        path = pathlib.Path(__file__).parent / f"{module}.py"
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def make_manifest(
+    mode: str,
+    worlds: typing.List[World],
+    hyperparams: typing.List[typing.Tuple[float, typing.Tuple[str, float]]],
+    seed: int,
+    **settings,
+) -> typing.Dict[str, typing.Any]:
+    return {
+        "mode": mode,
+        "code_version": get_code_version(),
+        "seed": seed,
+        "settings": settings,
+        "hyperparams": [
+            [float(alpha), kind, float(value)] for alpha, (kind, value) in hyperparams
+        ],
+        "worlds": [world.content_hash() for world in worlds],
+    }
+
+
+def read_manifest(
+    folder: pathlib.Path,
+) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    path = folder / MANIFEST_FILE
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def update_manifest(
+    folder: pathlib.Path, manifest: typing.Dict[str, typing.Any]
+) -> str:
+    # returns the id of the folder's current sweep; outputs finished under it
+    # came from identical work and can be kept, all others are redone
+    old_manifest = read_manifest(folder)
+    if old_manifest is not None:
+        sweep_id = old_manifest.pop("sweep_id", None)
+        if sweep_id is not None and old_manifest == manifest:
+            return sweep_id
+        changed = [k for k in manifest if old_manifest.get(k) != manifest[k]]
+        logging.info(f"Sweep in {folder} changed ({', '.join(changed)}), redoing it")
+    sweep_id = uuid.uuid4().hex
+    with open(folder / MANIFEST_FILE, "w") as f:
+        json.dump({**manifest, "sweep_id": sweep_id}, f, indent=1)
+    return sweep_id
+
+
+def mark_done(output_file: pathlib.Path, sweep_id: str) -> None:
+    # records output_file as finished under the sweep once it is in place; every
+    # output has its own record, written by rename, so that workers on several
+    # machines never write the same file, and no clocks are compared
+    finished = output_file.parent / FINISHED_FOLDER
+    finished.mkdir(exist_ok=True)
+    partial = finished / f"{output_file.name}.{uuid.uuid4().hex}.partial"
+    partial.write_text(sweep_id)
+    os.replace(partial, finished / output_file.name)
+
+
+def is_done(output_file: pathlib.Path, sweep_id: str) -> bool:
+    record = output_file.parent / FINISHED_FOLDER / output_file.name
+    try:
+        return output_file.exists() and record.read_text() == sweep_id
+    except FileNotFoundError:
+        return False
+
+
+def check_manifests(*folders: pathlib.Path) -> None:
+    # results are only comparable if they were made on the same worlds; other
+    # differences are worth knowing about but not fatal
+    manifests = {
+        folder: manifest
+        for folder in folders
+        if (manifest := read_manifest(folder)) is not None
+    }
+    if len(manifests) < 2:
+        return
+    (first, reference), *others = manifests.items()
+    for folder, manifest in others:
+        assert (
+            manifest["worlds"] == reference["worlds"]
+        ), f"{folder} and {first} were made on different worlds"
+        for key in ["code_version", "seed", "settings", "hyperparams"]:
+            if manifest[key] != reference[key]:
+                logging.warning(f"{folder} and {first} differ in {key}")
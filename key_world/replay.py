@@ -5,6 +5,7 @@ import pandas as pd  # type: ignore[import-untyped]
 import numpy as np
 import os
 import copy
+from concurrent.futures import Executor, Future
 
 
 class Replay:
@@ -14,6 +15,14 @@ class Replay:
         human_csv: str,
         alpha: float,
         update_criteria: typing.Tuple[str, float],
+        belief_epsilon: float = 0.0,
+        distance_prior: bool = False,
+        search_budget: typing.Optional[float] = None,
+        search_budget_unit: str = "nodes",
+        num_particles: int = 0,
+        resample_threshold: float = 0.5,
+        particle_seed: typing.Any = None,
+        executor: typing.Optional[Executor] = None,
     ) -> None:
         self.world = copy.deepcopy(world)
         self.human_csv = human_csv
@@ -39,6 +48,14 @@ class Replay:
             move_list=watcher_move_list,
             alpha=alpha,
             update_criteria=update_criteria,
+            belief_epsilon=belief_epsilon,
+            distance_prior=distance_prior,
+            search_budget=search_budget,
+            search_budget_unit=search_budget_unit,
+            num_particles=num_particles,
+            resample_threshold=resample_threshold,
+            particle_seed=particle_seed,
+            executor=executor,
         )
 
     def replay(self):
@@ -57,14 +74,202 @@ class Replay:
             ):
                 # if both agents are at the door with the correct key, open the door
                 self.world.maindoor.is_open = True
-        replay_data = pd.DataFrame.from_dict(
-            {
-                "log_likelihood": self.watcher.log_likelihood,
-                "action_prob": self.watcher.action_prob,
-                "goal_prob": self.watcher.goal_prob,
-                "action_surprisal": -np.log2(np.array(self.watcher.action_prob)),
-                "goal_surprisal": -np.log2(np.array(self.watcher.goal_prob)),
-                "reaction_time": self.human_data["reaction_time"],
-            }
+        return replay_frame(self.watcher, self.human_data["reaction_time"])
+
+
+class OnlineReplay:
+    # replays a human's Watcher moves while the game is still being played; each
+    # turn is worked out in the background while the human decides on a move
+    def __init__(
+        self,
+        world: World,
+        knower: Knower,
+        watcher: Watcher,
+        alpha: float,
+        update_criteria: typing.Tuple[str, float],
+        belief_epsilon: float = 0.0,
+        distance_prior: bool = False,
+        search_budget: typing.Optional[float] = None,
+        search_budget_unit: str = "nodes",
+        num_particles: int = 0,
+        resample_threshold: float = 0.5,
+        particle_seed: typing.Any = None,
+        executor: typing.Optional[Executor] = None,
+    ) -> None:
+        self.human = watcher
+        self.alpha = alpha
+        self.update_criteria = update_criteria
+        self.watcher = Watcher(
+            watcher.pos,
+            world,
+            knower,
+            None,
+            mode="replay",
+            move_list=[],
+            alpha=alpha,
+            update_criteria=update_criteria,
+            belief_epsilon=belief_epsilon,
+            distance_prior=distance_prior,
+            search_budget=search_budget,
+            search_budget_unit=search_budget_unit,
+            num_particles=num_particles,
+            resample_threshold=resample_threshold,
+            particle_seed=particle_seed,
+            executor=executor,
+        )
+        self.pending: typing.Optional[Future] = None
+
+    def start_turn(self, executor: Executor) -> None:
+        # must be followed by wait before the world changes again
+        self.watcher.pos = self.human.pos
+        self.watcher.key = self.human.key
+        self.pending = executor.submit(self.watcher.deliberate)
+
+    def wait(self) -> None:
+        if self.pending:
+            self.pending.result()
+
+    def finish_turn(self, move: Pos) -> None:
+        assert self.pending
+        move_dist, knower_probs = self.pending.result()
+        self.pending = None
+        self.watcher.move_list.append(move)  # type: ignore[union-attr]
+        self.watcher.score_move(move, move_dist, knower_probs)
+        self.watcher.num_moves += 1
+
+    def replay_data(self, reaction_times: typing.List[float]) -> pd.DataFrame:
+        return replay_frame(self.watcher, reaction_times)
+
+
+class ReplayTree:
+    # replays a recording under several update criteria at once; criteria that
+    # have made the same update decisions so far share one Watcher, which is
+    # forked when they disagree
+    def __init__(
+        self,
+        world: World,
+        human_csv: str,
+        alpha: float,
+        update_criteria: typing.List[typing.Tuple[str, float]],
+        belief_epsilon: float = 0.0,
+        distance_prior: bool = False,
+        search_budget: typing.Optional[float] = None,
+        search_budget_unit: str = "nodes",
+        num_particles: int = 0,
+        resample_threshold: float = 0.5,
+        particle_seed: typing.Any = None,
+        executor: typing.Optional[Executor] = None,
+    ) -> None:
+        assert update_criteria
+        self.world = copy.deepcopy(world)
+        self.human_csv = human_csv
+        self.alpha = alpha
+
+        assert os.path.exists(self.human_csv)
+        self.human_data = pd.read_csv(self.human_csv, index_col=False)
+        knower_move_list = [Pos(eval(pos)) for pos in self.human_data["knower_pos"]]
+        watcher_move_list = [Pos(eval(pos)) for pos in self.human_data["watcher_pos"]]
+        self.knower = Knower(
+            self.world.knower_start,
+            self.world,
+            self.world.maindoor.key_id,
+            move_list=knower_move_list,
+        )
+        # walks the recorded Watcher moves; the model Watchers only score them
+        self.body = Knower(
+            self.world.watcher_start,
+            self.world,
+            self.world.maindoor.key_id,
+            move_list=watcher_move_list,
         )
+        watcher = Watcher(
+            self.world.watcher_start,
+            self.world,
+            self.knower,
+            None,
+            mode="replay",
+            move_list=watcher_move_list,
+            alpha=alpha,
+            update_criteria=update_criteria[0],
+            belief_epsilon=belief_epsilon,
+            distance_prior=distance_prior,
+            search_budget=search_budget,
+            search_budget_unit=search_budget_unit,
+            num_particles=num_particles,
+            resample_threshold=resample_threshold,
+            particle_seed=particle_seed,
+            executor=executor,
+        )
+        self.branches = [(list(update_criteria), watcher)]
+
+    def branch(self) -> None:
+        branches = []
+        for criteria, watcher in self.branches:
+            decisions: typing.Dict[bool, typing.List[typing.Tuple[str, float]]] = {}
+            for update_criteria in criteria:
+                watcher.update_criteria = update_criteria
+                decisions.setdefault(watcher.should_update(), []).append(
+                    update_criteria
+                )
+            groups = list(decisions.values())
+            for group in groups[1:]:
+                forked = watcher.fork()
+                forked.update_criteria = group[0]
+                branches.append((group, forked))
+            watcher.update_criteria = groups[0][0]
+            branches.append((groups[0], watcher))
+        self.branches = branches
+
+    def replay(self) -> typing.Dict[typing.Tuple[str, float], pd.DataFrame]:
+        turn = 0
+        while not self.world.maindoor.is_open:
+            turn += 1
+            if turn % 2:
+                self.branch()
+                turns = []
+                for _, watcher in self.branches:
+                    watcher.pos, watcher.key = self.body.pos, self.body.key
+                    turns.append(watcher.deliberate())
+                move = self.body.move()
+                for (_, watcher), (move_dist, knower_probs) in zip(
+                    self.branches, turns
+                ):
+                    watcher.score_move(move, move_dist, knower_probs)
+                    watcher.num_moves += 1
+            else:
+                self.knower.move()
+            if self.world.at_main_door(
+                self.body.pos,
+                self.body.key.identifier if self.body.key else None,
+            ) and self.world.at_main_door(
+                self.knower.pos, self.knower.key.identifier if self.knower.key else None
+            ):
+                # if both agents are at the door with the correct key, open the door
+                self.world.maindoor.is_open = True
+        replay_data = {}
+        for criteria, watcher in self.branches:
+            frame = replay_frame(watcher, self.human_data["reaction_time"])
+            for update_criteria in criteria:
+                replay_data[update_criteria] = frame
         return replay_data
+
+
+def replay_frame(
+    watcher: Watcher, reaction_times: typing.Sequence[float]
+) -> pd.DataFrame:
+    replay_data = pd.DataFrame.from_dict(
+        {
+            "log_likelihood": watcher.log_likelihood,
+            "action_prob": watcher.action_prob,
+            "goal_prob": watcher.goal_prob,
+            "action_surprisal": -np.log2(np.array(watcher.action_prob)),
+            "goal_surprisal": -np.log2(np.array(watcher.goal_prob)),
+            "reaction_time": reaction_times,
+        }
+    )
+    if watcher.belief_epsilon > 0:
+        replay_data["approximation_error"] = watcher.approximation_error
+    if watcher.search_budget:
+        replay_data["search_nodes"] = watcher.search_nodes
+        replay_data["search_ms"] = watcher.search_ms
+    return replay_data
@@ -0,0 +1,242 @@
+import typing
+import heapq
+import weakref
+from collections import deque
+from key_world.world import World, Door, Pos, MainDoor, Orientation
+from key_world.algs_knower import Node, make_get_node, get_path_length
+
+if typing.TYPE_CHECKING:
+    from key_world.algs_watcher import SearchBudget
+
+
+class RoomGraph:
+    # With every door treated as a wall the grid falls apart into rooms, and
+    # an agent's key and door state can only change on a key cell or when it
+    # crosses a door. Searches over that state therefore only need to stop at
+    # points of interest (key cells, the cells on either side of a door and the
+    # goal cells), hopping between them with precomputed in-room distances or
+    # through a door, and only walk cells when a concrete path is needed.
+    def __init__(self, world: World) -> None:
+        self.world = world
+        self.version = world.version
+        self.pois: typing.Set[Pos] = set(k.pos for k in world.keys)
+        self.pois.update(goal_cells(world))
+        # door crossings out of each door cell, whatever key they need
+        self.portals: typing.Dict[Pos, typing.List[typing.Tuple[Pos, Door]]] = {}
+        for door in world.doors:
+            if isinstance(door, MainDoor):
+                continue
+            for pos, other in door_sides(door, world.shape):
+                self.pois.add(pos)
+                self.portals.setdefault(pos, []).append((other, door))
+        self.distances = {poi: self.room_distances(poi) for poi in self.pois}
+        # the same for the other cells searches have started from
+        self.start_distances: typing.Dict[Pos, typing.Dict[Pos, int]] = {}
+
+    def room_neighbors(self, pos: Pos) -> typing.List[Pos]:
+        # doors only match a key id, so with none every door acts as a wall
+        return [p for p, _ in self.world.get_accessible_neighbors(pos, None)]
+
+    def room_distances(self, source: Pos) -> typing.Dict[Pos, int]:
+        # distances to the points of interest in source's room, along paths
+        # that do not pass through another point of interest on the way; that
+        # includes stepping off source and back on, which can swap keys there
+        distances = {}
+        dist = {source: 0}
+        queue = deque([source])
+        while queue:
+            pos = queue.popleft()
+            if pos != source and pos in self.pois:
+                distances[pos] = dist[pos]
+                continue
+            for neighbor in self.room_neighbors(pos):
+                if neighbor not in dist:
+                    dist[neighbor] = dist[pos] + 1
+                    queue.append(neighbor)
+        if source in self.pois and any(
+            neighbor not in self.pois for neighbor in self.room_neighbors(source)
+        ):
+            distances[source] = 2
+        return distances
+
+    def room_path(self, source: Pos, target: Pos) -> typing.List[Pos]:
+        # cells after source on a shortest in-room path to target, the
+        # refinement of a single hop between points of interest
+        if source == target:
+            # stepping off and back on, see room_distances
+            for neighbor in self.room_neighbors(source):
+                if neighbor not in self.pois:
+                    return [neighbor, source]
+        parents: typing.Dict[Pos, typing.Optional[Pos]] = {source: None}
+        queue = deque([source])
+        while queue:
+            pos = queue.popleft()
+            if pos == target:
+                path = []
+                while parents[pos] is not None:
+                    path.append(pos)
+                    pos = parents[pos]  # type: ignore[assignment]
+                path.reverse()
+                return path
+            if pos != source and pos in self.pois:
+                continue
+            for neighbor in self.room_neighbors(pos):
+                if neighbor not in parents:
+                    parents[neighbor] = pos
+                    queue.append(neighbor)
+        raise RuntimeError(f"{target} is not in the room of {source}")
+
+    def search(
+        self,
+        start: Node,
+        goals: typing.List[Node],
+        key_agnostic: bool = False,
+        budget: typing.Optional["SearchBudget"] = None,
+    ) -> typing.Tuple[
+        typing.List[typing.Optional[typing.Tuple[Node, int]]],
+        typing.Dict[int, int],
+        typing.Optional[int],
+    ]:
+        # Dijkstra over (point of interest, key state) nodes, deduplicated like
+        # the cell searches; returns each goal's node and path length, the cost
+        # of every node's last hop and, if the budget ran out first, a lower
+        # bound on the length of the goals not reached
+        assert all(
+            goal.pos in self.pois for goal in goals
+        ), "Goals must be points of interest"
+        get_node = make_get_node(self.world, key_agnostic)
+        all_key_ids = [k.identifier for k in self.world.keys]
+        start_distances = self.distances.get(start.pos)
+        if start_distances is None:
+            if start.pos not in self.start_distances:
+                self.start_distances[start.pos] = self.room_distances(start.pos)
+            start_distances = self.start_distances[start.pos]
+        found: typing.List[typing.Optional[typing.Tuple[Node, int]]] = [None] * len(
+            goals
+        )
+        hop_costs: typing.Dict[int, int] = {}
+        counter = 0
+        heap = [(get_path_length(start), counter, start)]
+        settled = set()
+        while heap:
+            length, _, node = heapq.heappop(heap)
+            if node in settled:
+                continue
+            if budget is not None and not budget.expand():
+                return found, hop_costs, length
+            settled.add(node)
+            for i, goal in enumerate(goals):
+                if found[i] is None and node == goal:
+                    found[i] = (node, length)
+            if all(found):
+                break
+            distances = start_distances if node is start else self.distances[node.pos]
+            hops: typing.List[typing.Tuple[Pos, typing.Optional[Door], int]] = [
+                (pos, None, cost) for pos, cost in distances.items()
+            ]
+            key_ids: typing.Set[typing.Optional[int]] = set(node.used_key_ids)
+            key_ids.add(node.key_id)
+            if key_agnostic and node.key_id:
+                # if you have a key, you have all keys
+                key_ids.update(all_key_ids)
+            for other, door in self.portals.get(node.pos, []):
+                if door.key_id in key_ids:
+                    hops.append((other, door, 1))
+            for pos, barrier, cost in hops:
+                child = get_node(node, (pos, barrier))
+                if child not in settled:
+                    hop_costs[id(child)] = cost
+                    counter += 1
+                    heapq.heappush(heap, (length + cost, counter, child))
+        return found, hop_costs, None
+
+    def find_path_lengths(
+        self,
+        start: Node,
+        goals: typing.List[Node],
+        key_agnostic: bool = False,
+        budget: typing.Optional["SearchBudget"] = None,
+    ) -> typing.List[int]:
+        # same lengths as algs_knower.find_path_lengths; with a budget, goals not
+        # reached before it runs out get the best lower bound found so far, which
+        # is never below their manhattan distance
+        found, _, bound = self.search(start, goals, key_agnostic, budget)
+        if bound is None:
+            if not all(found):
+                raise RuntimeError("Could not find a path to the goal")
+            return [length for _, length in found]  # type: ignore[misc]
+        offset = get_path_length(start)
+        return [
+            result[1]
+            if result is not None
+            else max(bound, offset + manhattan_distance(start.pos, goal.pos))
+            for result, goal in zip(found, goals)
+        ]
+
+    def portal_targets(self, pos: Pos) -> typing.List[Pos]:
+        return [other for other, _ in self.portals.get(pos, [])]
+
+    def find_path(
+        self, start: Node, goal: Node, key_agnostic: bool = False
+    ) -> typing.List[Pos]:
+        # same as algs_knower.find_path up to ties between equally short paths
+        found, hop_costs, _ = self.search(start, [goal], key_agnostic)
+        if found[0] is None:
+            raise RuntimeError("Could not find a path to the goal")
+        node = found[0][0]
+        hops = []
+        while node is not start:
+            assert node.parent is not None
+            hops.append((node.parent.pos, node.pos, hop_costs[id(node)]))
+            node = node.parent
+        path: typing.List[Pos] = []
+        for source, target, cost in reversed(hops):
+            if cost == 1 and target in self.portal_targets(source):
+                path.append(target)
+            else:
+                path += self.room_path(source, target)
+        return path
+
+
+def manhattan_distance(a: Pos, b: Pos) -> int:
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def goal_cells(world: World) -> typing.List[Pos]:
+    # where the Knower and the Watcher stand to open the main door
+    x, y = world.maindoor.pos
+    return [Pos((x, y - 1)), Pos((x, y))]
+
+
+def door_sides(
+    door: Door, shape: typing.Tuple[int, int]
+) -> typing.List[typing.Tuple[Pos, Pos]]:
+    # (cell, cell across the door) for both sides, see World.get_accessible_neighbors
+    x, y = door.pos
+    if door.orientation is Orientation.HORIZONTAL:
+        other = Pos((x, y - 1))
+    else:
+        other = Pos((x - 1, y))
+    if not (0 <= other[0] < shape[0] and 0 <= other[1] < shape[1]):
+        return []
+    return [(Pos((x, y)), other), (other, Pos((x, y)))]
+
+
+# graphs of the last few world versions, so searches that apply moves and undo
+# them again (see World.undo) do not rebuild the graph of every state they revisit
+ROOM_GRAPH_CACHE_SIZE = 16
+room_graphs: "weakref.WeakKeyDictionary[World, typing.Dict[int, RoomGraph]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_room_graph(world: World) -> RoomGraph:
+    # rebuilt whenever the world's keys or doors change
+    versions = room_graphs.setdefault(world, {})
+    room_graph = versions.get(world.version)
+    if room_graph is None:
+        room_graph = RoomGraph(world)
+        if len(versions) >= ROOM_GRAPH_CACHE_SIZE:
+            del versions[next(iter(versions))]
+        versions[world.version] = room_graph
+    return room_graph
@@ -0,0 +1,178 @@
+import typing
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import socket
+import threading
+import time
+import traceback
+
+STATES = ["pending", "claimed", "done", "failed"]
+
+
+def get_worker_id() -> str:
+    # tells apart the processes of a sweep, on any machine
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    # Sweep tasks as json files in a folder that every machine of the sweep
+    # can reach, moved between pending/, claimed/, done/ and failed/ with
+    # renames. A rename is atomic, so only one worker gets each task. A claim
+    # is a lease: the worker touches the file while it runs the task, and a
+    # claim another worker has not seen touched for lease_seconds by its own
+    # clock (the worker died) goes back to pending; file times are only
+    # compared with themselves, so the machines' clocks need not agree.
+    # Failed tasks go back too, until they failed max_attempts times.
+    # Tasks skip finished outputs and replace files atomically, like the
+    # sweeps themselves, so one that runs twice does no harm.
+    def __init__(
+        self,
+        folder: pathlib.Path,
+        lease_seconds: float = 600.0,
+        max_attempts: int = 3,
+    ) -> None:
+        assert lease_seconds > 0 and max_attempts >= 1
+        self.folder = folder
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = get_worker_id()
+        # per claimed task, the file time this worker last saw and when it
+        # first saw it, by time.monotonic
+        self.last_touched: typing.Dict[str, typing.Tuple[int, float]] = {}
+        for state in STATES:
+            (folder / state).mkdir(parents=True, exist_ok=True)
+
+    def path(self, state: str, name: str) -> pathlib.Path:
+        return self.folder / state / name
+
+    def write(self, path: pathlib.Path, entry: typing.Dict[str, typing.Any]) -> None:
+        # the glob for tasks only matches the final name
+        partial_path = path.with_name(f"{path.name}.{self.worker_id}.partial")
+        with open(partial_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(partial_path, path)
+
+    def put(self, task: typing.Dict[str, typing.Any]) -> bool:
+        # tasks are named by their content, so putting a sweep in again only
+        # adds what is not already waiting or running
+        name = (
+            hashlib.sha256(json.dumps(task, sort_keys=True).encode()).hexdigest()[:16]
+            + ".json"
+        )
+        if self.path("pending", name).exists() or self.path("claimed", name).exists():
+            return False
+        self.write(
+            self.path("pending", name), {"task": task, "attempts": 0, "errors": []}
+        )
+        return True
+
+    def count(self, state: str) -> int:
+        return len(list((self.folder / state).glob("*.json")))
+
+    def claim(
+        self,
+    ) -> typing.Optional[typing.Tuple[str, typing.Dict[str, typing.Any]]]:
+        self.requeue_expired()
+        for path in sorted((self.folder / "pending").glob("*.json")):
+            try:
+                # renaming keeps the time, so the new lease is a new time
+                os.utime(path)
+                os.rename(path, self.path("claimed", path.name))
+            except FileNotFoundError:
+                # another worker was faster
+                continue
+            with open(self.path("claimed", path.name)) as f:
+                return path.name, json.load(f)
+        return None
+
+    def keep_alive(self, name: str, stop: threading.Event) -> None:
+        while not stop.wait(self.lease_seconds / 4):
+            try:
+                os.utime(self.path("claimed", name))
+            except FileNotFoundError:
+                logging.warning(f"Lost the lease on task {name}")
+                return
+
+    def finish(self, name: str) -> None:
+        try:
+            os.rename(self.path("claimed", name), self.path("done", name))
+        except FileNotFoundError:
+            # the lease ran out and the task was put back; its outputs are
+            # written either way, so whoever runs it again will skip them
+            logging.warning(f"Finished task {name} after losing its lease")
+
+    def release(self, name: str, error: str) -> None:
+        # moves a claimed task back to pending, or to failed after its last
+        # attempt; it is first renamed to a name only this worker knows, so a
+        # worker claiming it again from pending cannot be cut short by the cleanup
+        own_path = self.path("claimed", f"{name}.{self.worker_id}")
+        try:
+            os.rename(self.path("claimed", name), own_path)
+        except FileNotFoundError:
+            return
+        with open(own_path) as f:
+            entry = json.load(f)
+        entry["attempts"] += 1
+        entry["errors"].append(error)
+        state = "pending" if entry["attempts"] < self.max_attempts else "failed"
+        logging.warning(
+            f"Task {name} failed (attempt {entry['attempts']} of "
+            f"{self.max_attempts}), moving it to {state}"
+        )
+        self.write(self.path(state, name), entry)
+        own_path.unlink()
+
+    def requeue_expired(self) -> None:
+        now = time.monotonic()
+        last_touched = {}
+        for path in (self.folder / "claimed").glob("*.json"):
+            try:
+                touched = path.stat().st_mtime_ns
+            except FileNotFoundError:
+                continue
+            seen = self.last_touched.get(path.name)
+            if seen is None or seen[0] != touched:
+                seen = (touched, now)
+            last_touched[path.name] = seen
+            if seen[1] + self.lease_seconds < now:
+                self.release(path.name, f"lease expired after {self.lease_seconds}s")
+        self.last_touched = last_touched
+
+
+def work(
+    queue: WorkQueue,
+    run_task: typing.Callable[[typing.Dict[str, typing.Any]], None],
+    poll_seconds: float = 5.0,
+) -> int:
+    # runs tasks until none are left waiting or running anywhere, so failed
+    # or expired ones are picked up again; returns how many this worker ran
+    num_tasks = 0
+    while True:
+        claimed = queue.claim()
+        if claimed is None:
+            if queue.count("claimed") == 0:
+                return num_tasks
+            time.sleep(poll_seconds)
+            continue
+        name, entry = claimed
+        logging.info(f"Running task {name} (attempt {entry['attempts'] + 1})")
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=queue.keep_alive, args=(name, stop), daemon=True
+        )
+        heartbeat.start()
+        error = None
+        try:
+            run_task(entry["task"])
+        except Exception:
+            error = traceback.format_exc()
+        stop.set()
+        heartbeat.join()
+        if error is None:
+            queue.finish(name)
+        else:
+            queue.release(name, error)
+        num_tasks += 1
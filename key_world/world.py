@@ -1,9 +1,13 @@
 import typing
 from enum import Enum
+from dataclasses import dataclass
 from pydantic import BaseModel
-from collections import defaultdict
 from itertools import permutations
+from contextlib import contextmanager
 import copy
+import hashlib
+import json
+import pathlib
 
 Orientation = Enum("Orientation", ["HORIZONTAL", "VERTICAL"])
 Lookups = Enum("Lookups", ["KEY", "HORIZONTAL", "VERTICAL"])
@@ -11,27 +15,53 @@ Lookups = Enum("Lookups", ["KEY", "HORIZONTAL", "VERTICAL"])
 Pos = typing.NewType("Pos", typing.Tuple[int, int])
 
 
-class Wall(BaseModel):
+# Plain slotted classes, since searches create, copy and hash these all the
+# time; pydantic only checks worlds as they are loaded, see WorldData. Barriers
+# hash by where they are, so the (pos, door) options of a search spread out;
+# orientations hash by value, since enum hashes change from run to run.
+@dataclass(slots=True)
+class Wall:
     pos: Pos
     orientation: Orientation
 
+    def __hash__(self):
+        return hash((self.pos, self.orientation.value))
+
 
+@dataclass(slots=True)
 class Door(Wall):
     key_id: int
 
     def __hash__(self):
-        return 3 * hash(self.key_id) + hash("Door")
+        return hash((self.pos, self.orientation.value, self.key_id))
 
 
+@dataclass(slots=True)
 class MainDoor(Door):
     is_open: bool
 
+    def __hash__(self):
+        # is_open changes during a game
+        return hash((self.pos, self.orientation.value, self.key_id))
+
 
-class Key(BaseModel):
+@dataclass(slots=True)
+class Key:
     pos: Pos
     identifier: int
 
 
+class WorldData(BaseModel):
+    # the layout written by World.to_dict
+    shape: typing.Tuple[int, int]
+    knower_start: typing.Tuple[int, int]
+    watcher_start: typing.Tuple[int, int]
+    keys: typing.List[typing.Tuple[int, int, int]]
+    doors: typing.List[typing.Tuple[int, int, int, int]]
+    maindoor: typing.Tuple[int, int, int, int]
+    walls: typing.List[typing.Tuple[int, int, int]]
+
+
 class World:
     def __init__(
         self,
@@ -42,6 +72,7 @@ class World:
         doors: typing.List[Door],
         maindoor: MainDoor,
         walls: typing.List[Wall],
+        validate: bool = True,
     ) -> None:
         self.shape = shape
         self.knower_start = knower_start
@@ -51,7 +82,23 @@ class World:
         self.doors.append(maindoor)
         self.maindoor = maindoor
         self.walls = walls
-        lookups = self.validate_and_create_lookup()
+        # changes whenever keys or doors change, so searches can be cached per
+        # state; undo restores the previous version, new changes never reuse one
+        self.version = 0
+        self.last_version = 0
+        # per move applied during a lookahead: the agent's previous position,
+        # key and the world version, followed by the changes made to keys and
+        # doors; real moves are not journaled, see lookahead
+        self.lookahead_depth = 0
+        self.journal: typing.List[
+            typing.Tuple[
+                typing.Any, Pos, typing.Optional[Key], int, typing.List[typing.Tuple]
+            ]
+        ] = []
+        if validate:
+            lookups = self.validate_and_create_lookup()
+        else:
+            lookups = self.create_lookup()
         self.key_lookup = lookups[0]
         self.horizontal_lookup = lookups[1]
         self.vertical_lookup = lookups[2]
@@ -59,28 +106,94 @@ class World:
     def lookup(
         self, pos: Pos, lookup_type: Lookups
     ) -> typing.Optional[typing.Union[Wall, Door, Key]]:
+        # get, so that misses do not fill the lookups up during searches
         if lookup_type is Lookups.KEY:
-            return self.key_lookup[pos]
+            return self.key_lookup.get(pos)
         elif lookup_type is Lookups.HORIZONTAL:
-            return self.horizontal_lookup[pos]
+            return self.horizontal_lookup.get(pos)
         else:
-            return self.vertical_lookup[pos]
+            return self.vertical_lookup.get(pos)
+
+    def bump_version(self):
+        self.last_version += 1
+        self.version = self.last_version
+
+    def record(self, change: typing.Tuple) -> None:
+        if self.journal:
+            self.journal[-1][4].append(change)
+
+    def barrier_lookup(self, barrier: Wall):
+        if barrier.orientation is Orientation.HORIZONTAL:
+            return self.horizontal_lookup
+        return self.vertical_lookup
 
     def remove_door(self, door: Door):
-        self.doors.remove(door)
-        if door.orientation is Orientation.HORIZONTAL:
-            del self.horizontal_lookup[door.pos]
-        else:
-            del self.vertical_lookup[door.pos]
+        self.bump_version()
+        index = self.doors.index(door)
+        self.record(("remove_door", door, index))
+        del self.doors[index]
+        del self.barrier_lookup(door)[door.pos]
 
     def remove_key(self, key: Key):
-        self.keys.remove(key)
+        self.bump_version()
+        index = self.keys.index(key)
+        self.record(("remove_key", key, index))
+        del self.keys[index]
         del self.key_lookup[key.pos]
 
-    def add_key(self, key: Key):
+    def add_key(self, key: Key, pos: typing.Optional[Pos] = None):
+        self.bump_version()
+        self.record(("add_key", key, key.pos))
+        if pos is not None:
+            key.pos = pos
         self.keys.append(key)
         self.key_lookup[key.pos] = key
 
+    @contextmanager
+    def lookahead(self):
+        # moves applied inside can be undone; whatever is still journaled when
+        # the outermost lookahead ends is dropped, so the journal never outlives it
+        self.lookahead_depth += 1
+        try:
+            yield self
+        finally:
+            self.lookahead_depth -= 1
+            if self.lookahead_depth == 0:
+                self.journal.clear()
+
+    def apply(self, agent, pos: Pos, door: typing.Optional[Door] = None) -> None:
+        # moves agent to pos through door, picking up any key there; inside a
+        # lookahead, undo reverts the move and everything it changed without
+        # copying the world
+        if self.lookahead_depth > 0:
+            self.journal.append((agent, agent.pos, agent.key, self.version, []))
+        if door:
+            self.remove_door(door)
+        agent.pos = pos
+        key: typing.Optional[Key] = self.lookup(pos, Lookups.KEY)  # type: ignore[assignment]
+        if key:
+            agent.pickup_key(key)
+
+    def undo(self) -> None:
+        assert self.journal, "Nothing to undo"
+        agent, pos, key, version, changes = self.journal.pop()
+        for change in reversed(changes):
+            if change[0] == "remove_door":
+                _, door, index = change
+                self.doors.insert(index, door)
+                self.barrier_lookup(door)[door.pos] = door
+            elif change[0] == "remove_key":
+                _, key_removed, index = change
+                self.keys.insert(index, key_removed)
+                self.key_lookup[key_removed.pos] = key_removed
+            else:
+                _, key_added, old_pos = change
+                assert self.keys.pop() is key_added
+                del self.key_lookup[key_added.pos]
+                key_added.pos = old_pos
+        agent.pos, agent.key = pos, key
+        self.version = version
+
     def validate_and_create_lookup(
         self,
     ) -> typing.Tuple[
@@ -88,13 +201,13 @@ class World:
         typing.Dict[Pos, typing.Optional[typing.Union[Wall, Door]]],
         typing.Dict[Pos, typing.Optional[typing.Union[Wall, Door]]],
     ]:
-        key_lookup: typing.Dict[Pos, typing.Optional[Key]] = defaultdict(lambda: None)
+        key_lookup: typing.Dict[Pos, typing.Optional[Key]] = {}
         horizontal_lookup: typing.Dict[
             Pos, typing.Optional[typing.Union[Wall, Door]]
-        ] = defaultdict(lambda: None)
+        ] = {}
         vertical_lookup: typing.Dict[
             Pos, typing.Optional[typing.Union[Wall, Door]]
-        ] = defaultdict(lambda: None)
+        ] = {}
 
         assert (
             0 <= self.knower_start[0] < self.shape[0]
@@ -140,6 +253,30 @@ class World:
 
         return key_lookup, horizontal_lookup, vertical_lookup
 
+    def create_lookup(
+        self,
+    ) -> typing.Tuple[
+        typing.Dict[Pos, typing.Optional[Key]],
+        typing.Dict[Pos, typing.Optional[typing.Union[Wall, Door]]],
+        typing.Dict[Pos, typing.Optional[typing.Union[Wall, Door]]],
+    ]:
+        # same lookups as validate_and_create_lookup, for worlds known to be valid
+        key_lookup: typing.Dict[Pos, typing.Optional[Key]] = {}
+        horizontal_lookup: typing.Dict[
+            Pos, typing.Optional[typing.Union[Wall, Door]]
+        ] = {}
+        vertical_lookup: typing.Dict[
+            Pos, typing.Optional[typing.Union[Wall, Door]]
+        ] = {}
+        for barrier in self.doors + self.walls:
+            if barrier.orientation is Orientation.HORIZONTAL:
+                horizontal_lookup[barrier.pos] = barrier
+            else:
+                vertical_lookup[barrier.pos] = barrier
+        for key in self.keys:
+            key_lookup[key.pos] = key
+        return key_lookup, horizontal_lookup, vertical_lookup
+
     def get_accessible_neighbors(
         self, pos: Pos, key_id: typing.Optional[int]
     ) -> typing.List[typing.Tuple[Pos, typing.Optional[typing.Union[Door, MainDoor]]]]:
@@ -179,6 +316,69 @@ class World:
                 accessible_neighbors.append((Pos((pos[0], pos[1] + 1)), barrier))
         return accessible_neighbors
 
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        # compact layout: positions, orientations and ids as plain int lists
+        return {
+            "shape": list(self.shape),
+            "knower_start": list(self.knower_start),
+            "watcher_start": list(self.watcher_start),
+            "keys": [[*key.pos, key.identifier] for key in self.keys],
+            "doors": [
+                [*door.pos, door.orientation.value, door.key_id]
+                for door in self.doors
+                if door is not self.maindoor
+            ],
+            "maindoor": [
+                *self.maindoor.pos,
+                self.maindoor.orientation.value,
+                self.maindoor.key_id,
+            ],
+            "walls": [[*wall.pos, wall.orientation.value] for wall in self.walls],
+        }
+
+    @classmethod
+    def from_dict(
+        cls, data: typing.Dict[str, typing.Any], validate: bool = True
+    ) -> "World":
+        if validate:
+            data = WorldData.model_validate(data).model_dump()
+        door_x, door_y, door_orientation, door_key_id = data["maindoor"]
+        return cls(
+            shape=(data["shape"][0], data["shape"][1]),
+            knower_start=Pos((data["knower_start"][0], data["knower_start"][1])),
+            watcher_start=Pos((data["watcher_start"][0], data["watcher_start"][1])),
+            keys=[
+                Key(pos=Pos((x, y)), identifier=identifier)
+                for x, y, identifier in data["keys"]
+            ],
+            doors=[
+                Door(pos=Pos((x, y)), orientation=Orientation(o), key_id=key_id)
+                for x, y, o, key_id in data["doors"]
+            ],
+            maindoor=MainDoor(
+                pos=Pos((door_x, door_y)),
+                orientation=Orientation(door_orientation),
+                key_id=door_key_id,
+                is_open=False,
+            ),
+            walls=[
+                Wall(pos=Pos((x, y)), orientation=Orientation(o))
+                for x, y, o in data["walls"]
+            ],
+            validate=validate,
+        )
+
+    def content_hash(self) -> str:
+        return hash_world_dict(self.to_dict())
+
+    def fingerprint(self) -> typing.Tuple[typing.FrozenSet, typing.FrozenSet]:
+        # the keys and doors left, equal for equal states however they were
+        # reached, unlike version
+        return (
+            frozenset((k.pos, k.identifier) for k in self.keys),
+            frozenset((d.pos, d.orientation) for d in self.doors),
+        )
+
     def at_main_door(self, pos: Pos, key_id: typing.Optional[int]):
         x, y = self.maindoor.pos
         return (
@@ -188,6 +388,46 @@ class World:
         )
 
 
+def hash_world_dict(data: typing.Dict[str, typing.Any]) -> str:
+    # order of keys, doors and walls does not change the world
+    canonical = {
+        field: sorted(data[field]) if field in ["keys", "doors", "walls"] else value
+        for field, value in data.items()
+        if field != "hash"
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()[:16]
+
+
+def save_world_suite(worlds: typing.List[World], path: pathlib.Path) -> None:
+    records = []
+    for world in worlds:
+        record = world.to_dict()
+        record["hash"] = hash_world_dict(record)
+        records.append(record)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"worlds": records}, f, separators=(",", ":"))
+
+
+def load_world_suite(path: pathlib.Path, validate: bool = False) -> typing.List[World]:
+    with open(path) as f:
+        records = json.load(f)["worlds"]
+    worlds: typing.List[World] = []
+    for record in records:
+        # the stored hash stands in for validating every object on load
+        assert (
+            hash_world_dict(record) == record["hash"]
+        ), f"World {len(worlds)} in {path} does not match its hash"
+        worlds.append(World.from_dict(record, validate=validate))
+    return worlds
+
+
+def load_world_hashes(path: pathlib.Path) -> typing.List[str]:
+    with open(path) as f:
+        return [record["hash"] for record in json.load(f)["worlds"]]
+
+
 def generate_worlds():
     all_worlds = []
     for base_world in base_worlds:
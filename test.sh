@@ -1,2 +1,3 @@
 black .
-mypy .
\ No newline at end of file
+mypy .
+python -m pytest -q tests
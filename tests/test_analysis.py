@@ -0,0 +1,97 @@
+import pathlib
+import pandas as pd  # type: ignore[import-untyped]
+import pytest
+from key_world.analysis import (
+    extract_data,
+    get_comparison,
+    get_door_cells,
+    get_performance,
+    stream_comparison,
+    stream_performance,
+)
+from key_world.game import Game
+from key_world.generator import generate_world_suite
+from key_world.world import save_world_suite
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def assert_same_summary(in_memory, streamed, groupby):
+    # both modes have a row per group, each in its own order
+    def by_group(summary):
+        return summary.sort_values(
+            groupby, key=lambda col: col.astype(str), ignore_index=True
+        )
+
+    pd.testing.assert_frame_equal(
+        by_group(streamed[in_memory.columns]),
+        by_group(in_memory),
+        check_dtype=False,
+        rtol=1e-9,
+    )
+
+
+@pytest.mark.parametrize(
+    "folder,mode,groupby,avg_over",
+    [
+        ("human_data", "human", ["world"], ["subj"]),
+        ("model_data", "model", ["world", "alpha", "update_criteria"], []),
+    ],
+)
+def test_streamed_performance_matches(folder, mode, groupby, avg_over):
+    in_memory = get_performance(
+        extract_data(ROOT / folder, mode),
+        get_door_cells(ROOT / folder),
+        groupby=groupby,
+        avg_over=avg_over,
+    )
+    streamed = stream_performance(ROOT / folder, mode, groupby=groupby)
+    assert_same_summary(in_memory, streamed, groupby)
+
+
+@pytest.mark.parametrize("num_resamples", [0, 200])
+def test_streamed_comparison_matches(num_resamples):
+    groupby = ["alpha", "update_criteria"]
+    in_memory = get_comparison(
+        extract_data(ROOT / "replay_data", mode="replay"),
+        groupby=groupby,
+        avg_over=["subj", "world"],
+        num_resamples=num_resamples,
+        seed=1,
+    )
+    streamed = stream_comparison(
+        ROOT / "replay_data", groupby=groupby, num_resamples=num_resamples, seed=1
+    )
+    if num_resamples > 0:
+        assert "goal_correlation_r_ci_low" in streamed
+    # both draw the same resamples of the same recordings, so the bootstrap
+    # intervals agree too
+    assert_same_summary(in_memory, streamed, groupby)
+
+
+def test_performance_finds_each_worlds_door(tmp_path):
+    worlds = generate_world_suite(
+        [6, 8], worlds_per_size=3, num_key_ids=3, num_doors=2, seed=0
+    )
+    save_world_suite(worlds, tmp_path / "worlds.json")
+    for idx, world in enumerate(worlds):
+        Game(
+            world=world,
+            human_player=False,
+            alpha=4.0,
+            update_criteria=("action", 0.33),
+            record=True,
+            output_folder=str(tmp_path),
+            csv_name=f"model_{idx}.csv",
+            gui=False,
+        ).play()
+    summary = get_performance(
+        extract_data(tmp_path, "human"), get_door_cells(tmp_path), groupby=["world"]
+    )
+    assert summary["solved"].any()
+    # solved games end with both agents at the door
+    solved = summary[summary["solved"] == 1]
+    assert (solved["watcher_door_speed"] <= solved["num_rounds"]).all()
+    assert (solved["knower_door_speed"] <= solved["num_rounds"]).all()
+    streamed = stream_performance(tmp_path, "human", groupby=["world"])
+    assert_same_summary(summary, streamed, ["world"])
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+from key_world.world import all_worlds
+from key_world.algs_watcher import prune_beliefs
+from key_world.batch import GameBatch, prune_belief_arrays
+from key_world.game import Game
+
+SETTINGS = [
+    (idx, alpha, update_criteria)
+    for idx in range(len(all_worlds))
+    for alpha, update_criteria in [
+        (1.0, ("turn", 2)),
+        (16.0, ("action", 0.33)),
+        (4.0, ("goal", 0.17)),
+    ]
+]
+
+
+def play_batch(settings, belief_epsilon):
+    batch = GameBatch(all_worlds, settings, belief_epsilon=belief_epsilon)
+    batch.play()
+    return [
+        (batch.game_log(i).to_csv(index=False), batch.game_beliefs(i))
+        for i in range(len(settings))
+    ]
+
+
+@pytest.mark.parametrize("belief_epsilon", [0.0, 0.05])
+def test_batch_matches_game(tmp_path, belief_epsilon):
+    results = play_batch(SETTINGS, belief_epsilon)
+    for i, (idx, alpha, update_criteria) in enumerate(SETTINGS):
+        game = Game(
+            world=all_worlds[idx],
+            human_player=False,
+            alpha=alpha,
+            update_criteria=update_criteria,
+            record=True,
+            output_folder=str(tmp_path),
+            csv_name=f"{i}.csv",
+            gui=False,
+            belief_epsilon=belief_epsilon,
+        )
+        game.play()
+        log, beliefs = results[i]
+        assert (tmp_path / f"{i}.csv").read_text() == log, SETTINGS[i]
+        assert game.belief_history == beliefs, SETTINGS[i]
+
+
+@pytest.mark.parametrize("num_goals", range(2, 12))
+def test_pruning_ignores_padding(num_goals):
+    # a game's pruned beliefs and dropped mass are those of prune_beliefs,
+    # however many goals the other games in its batch have
+    rng = np.random.default_rng(num_goals)
+    for _ in range(100):
+        p = rng.dirichlet(np.full(num_goals, 0.5))
+        beliefs, pruned_mass = prune_beliefs(dict(enumerate(p.tolist())), 0.05)
+        for width in [num_goals, 16]:
+            padded = np.zeros((1, width))
+            padded[0, :num_goals] = p
+            got, kept, got_mass = prune_belief_arrays(padded, padded > 0, 0.05)
+            goals = np.flatnonzero(kept[0])
+            assert dict(zip(goals.tolist(), got[0, goals].tolist())) == beliefs
+            assert got_mass[0] == pruned_mass
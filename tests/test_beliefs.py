@@ -0,0 +1,30 @@
+import numpy as np
+from key_world.beliefs import BeliefStore, load_beliefs, pack_beliefs, save_beliefs
+
+
+def random_beliefs(rng, num_turns, goals):
+    return [
+        dict(zip(goals, rng.dirichlet(np.ones(len(goals))))) for _ in range(num_turns)
+    ]
+
+
+def test_store_reads_packed_and_redone_runs(tmp_path):
+    rng = np.random.default_rng(0)
+    for i in range(10):
+        goals = rng.choice(20, size=rng.integers(1, 8), replace=False).tolist()
+        save_beliefs(
+            tmp_path / f"{i}.npz", random_beliefs(rng, rng.integers(1, 30), goals)
+        )
+    pack_beliefs(tmp_path)
+    # one run is redone after packing
+    save_beliefs(tmp_path / "3.npz", random_beliefs(rng, 40, [5, 6]))
+    store = BeliefStore(tmp_path)
+    assert store.packed is not None
+    for i in range(10):
+        goals, trajectory = store.get(str(i))
+        expected_goals, expected = load_beliefs(tmp_path / f"{i}.npz")
+        np.testing.assert_array_equal(goals, expected_goals)
+        np.testing.assert_array_equal(trajectory, expected)
+        # the others come from the packed array
+        assert np.shares_memory(trajectory, store.packed) == (i != 3)
+    assert store.get("10") is None
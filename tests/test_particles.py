@@ -0,0 +1,57 @@
+import pandas as pd  # type: ignore[import-untyped]
+import pytest
+from key_world.world import all_worlds
+from key_world.game import Game
+
+
+def play(tmp_path, idx, num_particles, distance_prior):
+    game = Game(
+        world=all_worlds[idx],
+        human_player=False,
+        alpha=4.0,
+        update_criteria=("action", 0.33),
+        record=True,
+        output_folder=str(tmp_path),
+        csv_name=f"{num_particles}.csv",
+        gui=False,
+        distance_prior=distance_prior,
+        num_particles=num_particles,
+        particle_seed=[0, idx],
+    )
+    game.play()
+    return pd.read_csv(tmp_path / f"{num_particles}.csv"), game.belief_history
+
+
+@pytest.mark.parametrize("distance_prior", [False, True])
+@pytest.mark.parametrize("idx", range(len(all_worlds)))
+def test_many_particles_track_exact_beliefs(tmp_path, idx, distance_prior):
+    exact_log, exact_beliefs = play(tmp_path, idx, 0, distance_prior)
+    log, beliefs = play(tmp_path, idx, 10000, distance_prior)
+    # compared for as long as both Watchers made the same moves
+    num_turns = 0
+    while (
+        num_turns < min(len(log), len(exact_log))
+        and (log.iloc[num_turns] == exact_log.iloc[num_turns]).all()
+    ):
+        exact = exact_beliefs[num_turns]
+        assert beliefs[num_turns].keys() == exact.keys()
+        for goal, p in exact.items():
+            assert beliefs[num_turns][goal] == pytest.approx(p, abs=0.01)
+        num_turns += 1
+    assert num_turns >= min(10, len(exact_log))
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_as_many_particles_as_goals_open_the_door(seed):
+    # with exact beliefs, this game opens the main door
+    game = Game(
+        world=all_worlds[0],
+        human_player=False,
+        alpha=4.0,
+        update_criteria=("action", 0.33),
+        gui=False,
+        num_particles=2,
+        particle_seed=[0, seed],
+    )
+    game.play()
+    assert game.world.maindoor.is_open
@@ -0,0 +1,51 @@
+import pytest
+from key_world.world import all_worlds
+from key_world.algs_watcher import Planner
+from key_world.game import Game
+
+DEPTH = 3
+BUDGETS = [1, 5, 20, 100, 1000]
+
+
+def make_game(tmp_path, idx, planning_budget):
+    return Game(
+        world=all_worlds[idx],
+        human_player=False,
+        alpha=4.0,
+        update_criteria=("action", 0.33),
+        record=True,
+        output_folder=str(tmp_path),
+        csv_name=f"{planning_budget}.csv",
+        gui=False,
+        planning_depth=DEPTH,
+        planning_budget=planning_budget,
+    )
+
+
+@pytest.mark.parametrize("planning_budget", BUDGETS)
+@pytest.mark.parametrize("idx", range(3))
+def test_planner_opens_the_door(tmp_path, idx, planning_budget):
+    game = make_game(tmp_path, idx, planning_budget)
+    game.play()
+    assert game.world.maindoor.is_open
+
+
+@pytest.mark.parametrize("idx", range(len(all_worlds)))
+def test_budget_only_limits_depth(tmp_path, idx):
+    # a budget gives the costs of a whole search of some depth, which is never
+    # shallower for a larger budget
+    game = make_game(tmp_path, idx, BUDGETS[0])
+    world, watcher, knower = game.world, game.watcher, game.knower
+    unlimited = [
+        Planner(world, 4.0, depth, 10**9).plan(watcher, knower, watcher.beliefs)[0]
+        for depth in range(1, DEPTH + 1)
+    ]
+    depths = []
+    for budget in BUDGETS:
+        costs, _ = Planner(world, 4.0, DEPTH, budget).plan(
+            watcher, knower, watcher.beliefs
+        )
+        assert costs in unlimited, budget
+        depths.append(unlimited.index(costs))
+    assert depths == sorted(depths)
+    assert depths[-1] == DEPTH - 1
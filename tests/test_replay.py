@@ -0,0 +1,32 @@
+import pathlib
+import pytest
+from key_world.world import all_worlds
+from key_world.replay import Replay, ReplayTree
+
+HUMAN_DATA = pathlib.Path(__file__).resolve().parent.parent / "human_data"
+# criteria that keep updating together for some turns and then part
+UPDATE_CRITERIA = [
+    ("turn", 1),
+    ("turn", 3),
+    ("action", 0.33),
+    ("action", 0.65),
+    ("goal", 0.17),
+]
+SETTINGS = [
+    {},
+    {"belief_epsilon": 0.05},
+    {"num_particles": 4, "particle_seed": 0},
+]
+
+
+@pytest.mark.parametrize("settings", SETTINGS)
+@pytest.mark.parametrize("name", ["amani_4", "amani_12", "ingrid_0", "ingrid_14"])
+def test_tree_matches_separate_replays(name, settings):
+    human_csv = str(HUMAN_DATA / f"{name}.csv")
+    world = all_worlds[int(name.split("_")[1])]
+    tree = ReplayTree(world, human_csv, 4.0, UPDATE_CRITERIA, **settings).replay()
+    # the criteria did not all share one Watcher to the end
+    assert len(set(map(id, tree.values()))) > 1
+    for update_criteria in UPDATE_CRITERIA:
+        replay = Replay(world, human_csv, 4.0, update_criteria, **settings).replay()
+        assert tree[update_criteria].equals(replay), update_criteria
@@ -0,0 +1,64 @@
+import copy
+import random
+import pytest
+from key_world.world import all_worlds, Pos
+from key_world.agents import Knower
+from key_world.algs_knower import Node, find_path_lengths, make_get_neighbors
+from key_world.generator import generate_world_suite
+from key_world.rooms import RoomGraph
+
+WORLDS = list(all_worlds) + generate_world_suite(
+    [6, 8, 10], worlds_per_size=3, num_key_ids=3, num_doors=2, seed=0
+)
+
+
+def cell_lengths(world, start, goals, key_agnostic):
+    get_neighbors = make_get_neighbors(world, key_agnostic=key_agnostic)
+    try:
+        return find_path_lengths(start, goals, get_neighbors)
+    except RuntimeError:
+        return None
+
+
+def room_lengths(world, start, goals, key_agnostic):
+    try:
+        return RoomGraph(world).find_path_lengths(start, goals, key_agnostic)
+    except RuntimeError:
+        return None
+
+
+def key_states(world, rng, num_states):
+    # the world as it is and after agents wandered about, picking up and
+    # dropping keys and opening doors
+    world = copy.deepcopy(world)
+    agent = Knower(world.knower_start, world, world.maindoor.key_id)
+    yield world
+    for _ in range(num_states - 1):
+        for _ in range(rng.randrange(1, 30)):
+            options = world.get_accessible_neighbors(
+                agent.pos, agent.key.identifier if agent.key else None
+            )
+            world.apply(agent, *rng.choice(options + [(agent.pos, None)]))
+        yield world
+
+
+@pytest.mark.parametrize("idx", range(len(WORLDS)))
+def test_room_graph_matches_cell_search(idx):
+    rng = random.Random(idx)
+    for world in key_states(WORLDS[idx], rng, 3):
+        key_ids = sorted(set(k.identifier for k in world.keys))
+        cells = [
+            Pos((x, y)) for x in range(world.shape[0]) for y in range(world.shape[1])
+        ]
+        x, y = world.maindoor.pos
+        for _ in range(4):
+            start = Node(pos=rng.choice(cells), key_id=rng.choice([None] + key_ids))
+            # the Knower's and the Watcher's searches, see algs_watcher
+            for key_agnostic, goal_pos in [
+                (True, Pos((x, y - 1))),
+                (False, Pos((x, y))),
+            ]:
+                goals = [Node(pos=goal_pos, key_id=key_id) for key_id in key_ids]
+                assert room_lengths(world, start, goals, key_agnostic) == cell_lengths(
+                    world, start, goals, key_agnostic
+                )
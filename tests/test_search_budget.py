@@ -0,0 +1,38 @@
+import pandas as pd  # type: ignore[import-untyped]
+import pytest
+from key_world.world import all_worlds
+from key_world.game import Game
+
+# the columns only budgeted games log
+BUDGET_COLUMNS = ["search_nodes", "search_ms"]
+
+
+def play(tmp_path, idx, search_budget):
+    game = Game(
+        world=all_worlds[idx],
+        human_player=False,
+        alpha=4.0,
+        update_criteria=("action", 0.33),
+        record=True,
+        output_folder=str(tmp_path),
+        csv_name=f"{search_budget}.csv",
+        gui=False,
+        search_budget=search_budget,
+    )
+    game.play()
+    return pd.read_csv(tmp_path / f"{search_budget}.csv"), game.belief_history
+
+
+@pytest.mark.parametrize("idx", range(len(all_worlds)))
+def test_unlimited_budget_changes_nothing(tmp_path, idx):
+    log, beliefs = play(tmp_path, idx, None)
+    budgeted_log, budgeted_beliefs = play(tmp_path, idx, float("inf"))
+    assert (budgeted_log["search_nodes"] > 0).all()
+    pd.testing.assert_frame_equal(budgeted_log.drop(columns=BUDGET_COLUMNS), log)
+    assert budgeted_beliefs == beliefs
+
+
+@pytest.mark.parametrize("idx", range(len(all_worlds)))
+def test_small_budget_is_kept(tmp_path, idx):
+    log, _ = play(tmp_path, idx, 50)
+    assert (log["search_nodes"] <= 50).all()
@@ -0,0 +1,110 @@
+import os
+import pathlib
+import signal
+import socket
+import subprocess
+import sys
+import time
+import pandas as pd  # type: ignore[import-untyped]
+from key_world.beliefs import load_beliefs
+from key_world.work_queue import WorkQueue
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+# one alpha and one threshold of each kind, on every built-in world
+SWEEP = ["--num_alphas", "1", "--num_n_turns", "1"]
+SWEEP += ["--num_p_actions", "1", "--num_p_goals", "1"]
+
+
+def key_world(*args):
+    subprocess.run([sys.executable, "-m", "key_world", *args], cwd=ROOT, check=True)
+
+
+def start_worker(queue_args):
+    return subprocess.Popen(
+        [sys.executable, "-m", "key_world", "--worker", *queue_args],
+        cwd=ROOT,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_until(condition, timeout=120.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def count(folder, state):
+    return len(list((folder / state).glob("*.json")))
+
+
+def test_workers_survive_lost_leases(tmp_path):
+    folder = tmp_path / "model_data"
+    queue_folder = tmp_path / "queue"
+    queue_args = ["--queue_folder", str(queue_folder), "--lease_seconds", "2"]
+    sweep_args = ["--run_model", "--run_model_folder", str(folder), *SWEEP]
+    key_world(*sweep_args, *queue_args)
+    num_tasks = count(queue_folder, "pending")
+    assert num_tasks > 0
+
+    def playing(worker):
+        partial_folder = folder / "partial" / f"{socket.gethostname()}-{worker.pid}"
+        return lambda: any(partial_folder.glob("*.csv"))
+
+    workers = []
+    try:
+        # one worker dies mid-game and another stalls mid-game for longer than
+        # its lease, so its game is played again while it still holds it
+        killed = start_worker(queue_args)
+        wait_until(playing(killed))
+        killed.kill()
+        killed.wait()
+        stalled = start_worker(queue_args)
+        workers.append(stalled)
+        wait_until(playing(stalled))
+        stalled.send_signal(signal.SIGSTOP)
+        workers += [start_worker(queue_args) for _ in range(3)]
+        wait_until(lambda: count(queue_folder, "done") == num_tasks, timeout=300)
+        stalled.send_signal(signal.SIGCONT)
+        for worker in workers:
+            assert worker.wait(timeout=120) == 0
+    finally:
+        for worker in workers:
+            worker.kill()
+    assert count(queue_folder, "failed") == 0
+    assert count(queue_folder, "claimed") == 0
+
+    # every game's log is whole and matches its beliefs
+    csvs = sorted(folder.glob("update=*.csv"))
+    assert len(csvs) == num_tasks
+    for csv in csvs:
+        log = pd.read_csv(csv)
+        _, beliefs = load_beliefs(csv.with_suffix(".npz"))
+        assert len(log) == len(beliefs), csv.name
+
+    # and running the sweep again only finishes it
+    modified = {csv: csv.stat().st_mtime_ns for csv in csvs}
+    key_world(*sweep_args, *queue_args)
+    assert count(queue_folder, "pending") == 0
+    assert {csv: csv.stat().st_mtime_ns for csv in csvs} == modified
+
+
+def test_leases_do_not_compare_clocks(tmp_path):
+    # the workers touching these run on machines whose clocks are a day behind
+    queue = WorkQueue(tmp_path, lease_seconds=0.5)
+    for i in range(2):
+        queue.put({"task": i})
+    claims = [queue.claim(), queue.claim()]
+    assert None not in claims
+    live, dead = [name for name, _ in claims]
+    day_ago = time.time() - 24 * 3600
+    for name in [live, dead]:
+        os.utime(queue.path("claimed", name), (day_ago, day_ago))
+    deadline = time.monotonic() + 1.0
+    while time.monotonic() < deadline:
+        day_ago += 1
+        os.utime(queue.path("claimed", live), (day_ago, day_ago))
+        queue.requeue_expired()
+        time.sleep(0.1)
+    assert queue.path("claimed", live).exists()
+    assert queue.path("pending", dead).exists()
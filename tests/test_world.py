@@ -0,0 +1,106 @@
+import copy
+import os
+import pathlib
+import random
+import subprocess
+import sys
+import pytest
+from key_world.world import all_worlds
+from key_world.agents import Knower
+from key_world.generator import generate_world_suite
+from key_world.__main__ import check_worlds
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+WORLDS = list(all_worlds) + generate_world_suite(
+    [6, 8], worlds_per_size=3, num_key_ids=3, num_doors=2, seed=0
+)
+
+
+def snapshot(world, agents):
+    return (
+        world.to_dict(),
+        sorted((pos, key.identifier) for pos, key in world.key_lookup.items()),
+        sorted(world.horizontal_lookup),
+        sorted(world.vertical_lookup),
+        [(a.pos, a.key.identifier if a.key else None) for a in agents],
+        world.version,
+    )
+
+
+def random_move(world, agent, rng):
+    options = world.get_accessible_neighbors(
+        agent.pos, agent.key.identifier if agent.key else None
+    )
+    return rng.choice(options + [(agent.pos, None)])
+
+
+@pytest.mark.parametrize("idx", range(len(WORLDS)))
+def test_undo_restores_every_move(idx):
+    world = copy.deepcopy(WORLDS[idx])
+    agents = [
+        Knower(world.knower_start, world, world.maindoor.key_id),
+        Knower(world.watcher_start, world, world.maindoor.key_id),
+    ]
+    rng = random.Random(idx)
+    snapshots = []
+    with world.lookahead():
+        for _ in range(300):
+            agent = rng.choice(agents)
+            snapshots.append(snapshot(world, agents))
+            world.apply(agent, *random_move(world, agent, rng))
+            if rng.random() < 0.3:
+                world.undo()
+                assert snapshot(world, agents) == snapshots.pop()
+        while snapshots:
+            world.undo()
+            assert snapshot(world, agents) == snapshots.pop()
+    assert not world.journal
+
+
+def test_journal_only_lives_in_lookahead():
+    world = copy.deepcopy(all_worlds[0])
+    knower = Knower(world.knower_start, world, world.maindoor.key_id)
+    rng = random.Random(0)
+    for _ in range(20):
+        world.apply(knower, *random_move(world, knower, rng))
+    assert not world.journal
+    with world.lookahead():
+        for _ in range(5):
+            world.apply(knower, *random_move(world, knower, rng))
+        with world.lookahead():
+            world.apply(knower, *random_move(world, knower, rng))
+        assert len(world.journal) == 6
+    assert not world.journal
+
+
+def test_knower_paths_do_not_depend_on_hash_seed():
+    # sweeps run in many processes, which must all play the same games
+    script = (
+        "from key_world.world import all_worlds\n"
+        "from key_world.algs_knower import get_moves\n"
+        "print([get_moves(world) for world in all_worlds])"
+    )
+    paths = {
+        subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=ROOT,
+            env={**os.environ, "PYTHONHASHSEED": str(seed)},
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        for seed in range(4)
+    }
+    assert len(paths) == 1
+
+
+def test_input_folders_keep_their_files(tmp_path):
+    # recordings are only read, so they never get a suite written into them
+    check_worlds(tmp_path, all_worlds, output=False)
+    assert not (tmp_path / "worlds.json").exists()
+    with pytest.raises(AssertionError):
+        check_worlds(tmp_path, WORLDS, output=False)
+    check_worlds(tmp_path, WORLDS)
+    check_worlds(tmp_path, WORLDS, output=False)
+    with pytest.raises(AssertionError):
+        check_worlds(tmp_path, all_worlds, output=False)